@@ -0,0 +1,56 @@
+import os
+import numpy as np
+from annoy import AnnoyIndex
+from quantization import BLOCK_SIZE, truncate
+
+
+class AnnoyCandidates:
+    """
+    Approximate nearest neighbour candidates from an Annoy forest over the
+    store's embeddings (angular distance, i.e. cosine ranking).
+
+    `n_trees` trades build time and index size for accuracy, `search_k` is
+    the number of nodes inspected per query (-1 lets Annoy use
+    n_trees * n). A saved index is memory-mapped by Annoy on load, so it opens
+    instantly and is shared between processes.
+    """
+
+    def __init__(self, index: AnnoyIndex, dim: int, n_trees: int, search_k: int = -1):
+        self.index = index
+        self.dim = dim
+        self.n_trees = n_trees
+        self.search_k = search_k
+
+    def __len__(self):
+        return self.index.get_n_items()
+
+    @staticmethod
+    def file_name(dim: int, n_trees: int) -> str:
+        return f"annoy_{dim}_{n_trees}.ann"
+
+    @classmethod
+    def build(cls, vectors, dim: int, n_trees: int, path: str, search_k: int = -1):
+        index = AnnoyIndex(dim, "angular")
+        for start in range(0, len(vectors), BLOCK_SIZE):
+            for i, vector in enumerate(truncate(vectors[start:start + BLOCK_SIZE], dim), start):
+                index.add_item(i, vector)
+        index.build(n_trees, n_jobs=-1)
+        index.save(os.path.join(path, cls.file_name(dim, n_trees)))
+        index.unload()
+        return cls.load(path, dim, n_trees, search_k)
+
+    @classmethod
+    def load(cls, path: str, dim: int, n_trees: int, search_k: int = -1):
+        index = AnnoyIndex(dim, "angular")
+        index.load(os.path.join(path, cls.file_name(dim, n_trees)))
+        return cls(index, dim, n_trees, search_k)
+
+    def search(self, query_vector: np.ndarray, n: int) -> np.ndarray:
+        """
+        Rows of (about) the `n` nearest neighbours of a full dimension query.
+        """
+        query = truncate(query_vector[None], self.dim)[0]
+        return np.asarray(self.index.get_nns_by_vector(query, n, search_k=self.search_k), dtype=np.int64)
+
+    def close(self):
+        self.index.unload()
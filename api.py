@@ -1,84 +1,265 @@
-from fastapi import FastAPI
+from functools import lru_cache
+import hashlib
+import os
+import threading
+from typing import Optional
+from fastapi import FastAPI, Query, Request, Response
+import numpy as np
+import orjson
 import pandas as pd
 
-# Load dataset
-DATASET_PATH = "C:/Users/ASUS/Downloads/mock api/Order_Data_Dataset.csv"
+# Load dataset (ORDER_DATASET_PATH overrides the default location, e.g. for bench_api.py)
+DATASET_PATH = os.environ.get("ORDER_DATASET_PATH", "C:/Users/ASUS/Downloads/mock api/Order_Data_Dataset.csv")
+
+# record endpoints return one page of rows at a time
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
-df = pd.read_csv(DATASET_PATH)
-df = df[:100]
 # Initialize FastAPI app
 app = FastAPI(title="E-commerce Dataset API", description="API for querying e-commerce sales data")
 
-# Clean data (e.g., handle NaN values) at the start
-df.fillna(value="", inplace=True)
+
+def _json(obj) -> bytes:
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _file_hash(path, block_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _inverted_index(column: pd.Series) -> dict:
+    # lowercase value -> ascending row positions
+    keys = column.fillna("").astype(str).str.lower()
+    return keys.groupby(keys.to_numpy()).indices
+
+
+class Dataset:
+    """
+    The order dataset with its lookups prepared at load time.
+
+    Responses that do not depend on request parameters (the aggregates) are
+    computed once and kept as JSON bytes. The filtered endpoints go through
+    indexes instead of scanning the table: customer id -> row positions,
+    lowercase category and priority -> row positions, and the rows sorted by
+    profit. A request then costs a lookup plus the rows of one page.
+    `version` is a hash of the source file and goes into every ETag, so a
+    reload with changed data invalidates what clients cached.
+    """
+
+    def __init__(self, path: str = DATASET_PATH):
+        self.path = path
+        self.version = _file_hash(path)
+        raw = pd.read_csv(path)
+
+        # aggregates over the numeric columns, before the blanks are filled in
+        self.aggregates = {
+            "total-sales-by-category": _json(
+                raw.groupby("Product_Category")["Sales"].sum().reset_index().to_dict(orient="records")
+            ),
+            "shipping-cost-summary": _json({
+                "average_shipping_cost": raw["Shipping_Cost"].mean(),
+                "min_shipping_cost": raw["Shipping_Cost"].min(),
+                "max_shipping_cost": raw["Shipping_Cost"].max()
+            }),
+            "profit-by-gender": _json(
+                raw.groupby("Gender")["Profit"].sum().reset_index().to_dict(orient="records")
+            ),
+        }
+
+        # lookup indexes, all as ascending row positions
+        self.customers = raw.groupby("Customer_Id").indices
+        self.categories = _inverted_index(raw["Product_Category"])
+        self.priorities = _inverted_index(raw["Order_Priority"])
+        profit = raw["Profit"].to_numpy(dtype=float)
+        self.profit_order = np.flatnonzero(~np.isnan(profit))
+        self.profit_order = self.profit_order[np.argsort(profit[self.profit_order], kind="stable")]
+        self.sorted_profit = profit[self.profit_order]
+        self.all_rows = np.arange(len(raw))
+
+        # Clean data (e.g., handle NaN values) for the record endpoints
+        self.columns = raw.columns.tolist()
+        self.rows = raw.fillna(value="").to_dict(orient="records")
+
+    def fields(self, fields: Optional[str]):
+        """
+        The requested columns of a comma separated `fields` parameter, all
+        columns when it is empty, or the unknown names as an error.
+        """
+        if not fields:
+            return None, None
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in self.columns]
+        if unknown:
+            return None, {"error": f"Unknown fields: {', '.join(unknown)}", "fields": self.columns}
+        return names, None
+
+    def page(self, positions, limit: int, offset: int, fields=None):
+        """
+        JSON bytes of the rows at positions[offset:offset + limit], projected
+        to `fields`, and the X-Total-Count header.
+        """
+        rows = [self.rows[i] for i in positions[offset:offset + limit]]
+        if fields is not None:
+            rows = [{name: row[name] for name in fields} for row in rows]
+        return _json(rows), {"X-Total-Count": str(len(positions))}
+
+
+data = Dataset()
+_reload_lock = threading.Lock()
+
+
+def _respond(request: Request, build) -> Response:
+    """
+    JSON response from `build(dataset)`, which returns the body or (body,
+    extra headers), with an ETag derived from the dataset version and the
+    request URL. A matching If-None-Match gets a 304 without calling `build`.
+    """
+    dataset = data
+    url = f"{request.url.path}?{request.url.query}"
+    etag = f'"{dataset.version}-{hashlib.blake2b(url.encode(), digest_size=8).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    content = build(dataset)
+    if isinstance(content, tuple):
+        content, extra = content
+        headers.update(extra)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def _respond_page(request: Request, find, error: str, limit: int, offset: int, fields: Optional[str]) -> Response:
+    """
+    One page of the rows `find(dataset)` returns, or {"error": error} when
+    there are none.
+    """
+    def build(dataset):
+        names, problem = dataset.fields(fields)
+        if problem:
+            return _json(problem)
+        positions = find(dataset)
+        if not len(positions):
+            return _json({"error": error})
+        return dataset.page(positions, limit, offset, names)
+
+    return _respond(request, build)
+
+
+# substring matches (case-insensitive) over the distinct values of an inverted
+# index, merged once per term and kept for the dataset they were computed from
+def _matching_rows(index: dict, term: str):
+    term = term.lower()
+    matches = [positions for value, positions in index.items() if term in value]
+    if len(matches) == 1:
+        return matches[0]
+    return np.sort(np.concatenate(matches)) if matches else np.empty(0, dtype=np.intp)
+
+
+@lru_cache(maxsize=256)
+def _category_rows(dataset: Dataset, category: str):
+    return _matching_rows(dataset.categories, category)
+
+
+@lru_cache(maxsize=256)
+def _priority_rows(dataset: Dataset, priority: str):
+    return _matching_rows(dataset.priorities, priority)
+
+
+@lru_cache(maxsize=256)
+def _high_profit_rows(dataset: Dataset, min_profit: float):
+    # rows with profit > min_profit, back in dataset order
+    start = np.searchsorted(dataset.sorted_profit, min_profit, side="right")
+    return np.sort(dataset.profit_order[start:])
+
+
+_RESULT_CACHES = (_category_rows, _priority_rows, _high_profit_rows)
+
+# pagination and projection parameters shared by the record endpoints
+Limit = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Rows per page")
+Offset = Query(0, ge=0, description="Rows to skip")
+Fields = Query(None, description="Comma separated columns to return, all when omitted")
+
 
 @app.get("/")
-def root():
-    return df.to_dict(orient="records")
+def root(request: Request, limit: int = Limit, offset: int = Offset, fields: Optional[str] = Fields):
+    return _respond_page(request, lambda dataset: dataset.all_rows, "The dataset is empty", limit, offset, fields)
 
 # Endpoint to get all data
 @app.get("/data")
-def get_all_data():
-    """Retrieve all records in the dataset."""
-    return df.to_dict(orient="records")
+def get_all_data(request: Request, limit: int = Limit, offset: int = Offset, fields: Optional[str] = Fields):
+    """Retrieve all records in the dataset, one page at a time."""
+    return _respond_page(request, lambda dataset: dataset.all_rows, "The dataset is empty", limit, offset, fields)
 
 # Endpoint to filter data by Customer ID
 @app.get("/data/customer/{customer_id}")
-def get_customer_data(customer_id: int):
+def get_customer_data(customer_id: int, request: Request, limit: int = Limit, offset: int = Offset,
+                      fields: Optional[str] = Fields):
     """Retrieve all records for a specific Customer ID."""
-    filtered_data = df[df["Customer_Id"] == customer_id]
-    if filtered_data.empty:
-        return {"error": f"No data found for Customer ID {customer_id}"}
-    return filtered_data.to_dict(orient="records")
+    return _respond_page(
+        request, lambda dataset: dataset.customers.get(customer_id, ()),
+        f"No data found for Customer ID {customer_id}", limit, offset, fields
+    )
 
 # Endpoint to filter data by Product Category
 @app.get("/data/product-category/{category}")
-def get_product_category_data(category: str):
+def get_product_category_data(category: str, request: Request, limit: int = Limit, offset: int = Offset,
+                              fields: Optional[str] = Fields):
     """Retrieve all records for a specific Product Category."""
-    filtered_data = df[df["Product_Category"].str.contains(category, case=False, na=False)]
-    if filtered_data.empty:
-        return {"error": f"No data found for Product Category '{category}'"}
-    return filtered_data.to_dict(orient="records")
+    return _respond_page(
+        request, lambda dataset: _category_rows(dataset, category),
+        f"No data found for Product Category '{category}'", limit, offset, fields
+    )
 
 # Endpoint to get orders with specific priorities
 @app.get("/data/order-priority/{priority}")
-def get_orders_by_priority(priority: str):
+def get_orders_by_priority(priority: str, request: Request, limit: int = Limit, offset: int = Offset,
+                           fields: Optional[str] = Fields):
     """Retrieve all orders with the given priority."""
-    filtered_data = df[df["Order_Priority"].str.contains(priority, case=False, na=False)]
-    if filtered_data.empty:
-        return {"error": f"No data found for Order Priority '{priority}'"}
-    return filtered_data.to_dict(orient="records")
+    return _respond_page(
+        request, lambda dataset: _priority_rows(dataset, priority),
+        f"No data found for Order Priority '{priority}'", limit, offset, fields
+    )
 
 # Endpoint to calculate total sales by Product Category
 @app.get("/data/total-sales-by-category")
-def total_sales_by_category():
+def total_sales_by_category(request: Request):
     """Calculate total sales by Product Category."""
-    sales_summary = df.groupby("Product_Category")["Sales"].sum().reset_index()
-    return sales_summary.to_dict(orient="records")
+    return _respond(request, lambda dataset: dataset.aggregates["total-sales-by-category"])
 
 # Endpoint to get high-profit products
 @app.get("/data/high-profit-products")
-def high_profit_products(min_profit: float = 100.0):
+def high_profit_products(request: Request, min_profit: float = 100.0, limit: int = Limit, offset: int = Offset,
+                         fields: Optional[str] = Fields):
     """Retrieve products with profit greater than the specified value."""
-    filtered_data = df[df["Profit"] > min_profit]
-    if filtered_data.empty:
-        return {"error": f"No products found with profit greater than {min_profit}"}
-    return filtered_data.to_dict(orient="records")
+    return _respond_page(
+        request, lambda dataset: _high_profit_rows(dataset, min_profit),
+        f"No products found with profit greater than {min_profit}", limit, offset, fields
+    )
 
 # Endpoint to get shipping cost summary
 @app.get("/data/shipping-cost-summary")
-def shipping_cost_summary():
+def shipping_cost_summary(request: Request):
     """Retrieve the average, minimum, and maximum shipping cost."""
-    summary = {
-        "average_shipping_cost": df["Shipping_Cost"].mean(),
-        "min_shipping_cost": df["Shipping_Cost"].min(),
-        "max_shipping_cost": df["Shipping_Cost"].max()
-    }
-    return summary
+    return _respond(request, lambda dataset: dataset.aggregates["shipping-cost-summary"])
 
 # Endpoint to calculate total profit by Gender
 @app.get("/data/profit-by-gender")
-def profit_by_gender():
+def profit_by_gender(request: Request):
     """Calculate total profit by customer gender."""
-    profit_summary = df.groupby("Gender")["Profit"].sum().reset_index()
-    return profit_summary.to_dict(orient="records")
\ No newline at end of file
+    return _respond(request, lambda dataset: dataset.aggregates["profit-by-gender"])
+
+# Endpoint to reload the dataset after the CSV changed
+@app.post("/reload")
+def reload_dataset():
+    """Reload the dataset, rebuilding the indexes and precomputed responses if the file changed."""
+    global data
+    with _reload_lock:
+        if _file_hash(DATASET_PATH) == data.version:
+            return {"reloaded": False, "version": data.version}
+        data = Dataset()
+        for cache in _RESULT_CACHES:
+            cache.cache_clear()
+    return {"reloaded": True, "version": data.version}
@@ -1,11 +1,20 @@
 import streamlit as st
 import os
-import sqlite3
+import uuid
 from dotenv import load_dotenv
-from main import create_documents, build_vectorstore, setup_database, execute_sql_query, format_sql_results
+from doc_processor import iter_documents
+from vectorstore_builder import build_vectorstore
+from database import setup_database, execute_sql_query
+from context_builder import ContextBuilder
 from model_config import setup_workflow, setup_model
 from data_loader import load_data
+from database import ConnectionPool, get_data_version, get_main_categories
+from caching import SemanticSQLCache, ResponseCache, stream_with_response_cache
+from config import SPECULATIVE_RETRIEVAL, HYBRID_RETRIEVAL
+from bm25_index import load_or_build_bm25_index
+from retrieval import retrieve_documents, start_retrieval
 from query_analyzer import QueryAnalyzer
+from memory import turn_message
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
@@ -15,25 +24,77 @@ st.set_page_config(
     page_title="E-Commerce Chatbot",
 )
 
+# Heavy resources are built once per process by whichever session needs them
+# first and shared read-only by every session afterwards; a session only owns
+# its conversation thread id.
+
+@st.cache_resource
+def get_db_pool():
+    # one read-only pool per process, shared by every session
+    setup_database().close()
+    return ConnectionPool()
+
+
+@st.cache_resource
+def get_categories():
+    # product categories a query can name, used as retrieval filters
+    return get_main_categories(get_db_pool())
+
+
+@st.cache_resource
+def get_response_cache():
+    # keys include the thread digest, so sessions never see each other's turns
+    return ResponseCache()
+
+
+@st.cache_resource
+def get_context_builder():
+    return ContextBuilder()
+
+
+@st.cache_resource
+def get_llm():
+    return setup_model()
+
+
+@st.cache_resource
+def get_workflow():
+    # one compiled graph and checkpointer, conversations are kept apart by thread_id
+    return setup_workflow(get_llm())
+
+
+@st.cache_resource
+def get_vectorstore():
+    order_df, product_df = load_data()
+    docs = iter_documents((order_df, product_df))
+    return build_vectorstore(docs)
+
+
+@st.cache_resource
+def get_bm25_index():
+    return load_or_build_bm25_index(get_vectorstore()) if HYBRID_RETRIEVAL else None
+
+
+@st.cache_resource
+def get_query_analyzer():
+    sql_cache = SemanticSQLCache(embedding_model=get_vectorstore().embeddings)
+    return QueryAnalyzer(llm=get_llm(), cache=sql_cache)
+
+
 if 'initialized' not in st.session_state:
     st.session_state.initialized = False
-    st.session_state.vectordb = None
-    st.session_state.llm = None
-    st.session_state.query_analyzer = None
-    st.session_state.app = None
+    st.session_state.thread_id = uuid.uuid4().hex
 
 
 
 def initialize_system():
     with st.spinner("Initializing the system..."):
-
-        st.session_state.llm = setup_model()
-        st.session_state.query_analyzer = QueryAnalyzer(llm=st.session_state.llm)
-        st.session_state.app = setup_workflow()
-
-        order_df, product_df = load_data()
-        docs = create_documents((order_df, product_df))
-        st.session_state.vectordb = build_vectorstore(docs)
+        # instant for every session after the first one in this process
+        get_db_pool()
+        get_workflow()
+        get_vectorstore()
+        get_bm25_index()
+        get_query_analyzer()
 
         st.session_state.initialized = True
 
@@ -53,63 +114,66 @@ if not st.session_state.initialized:
     st.info("click 'Initialize System' in the sidebar to start.")
     st.stop()
 
-if 'thread_counter' not in st.session_state:
-    st.session_state.thread_counter = 1
-
 query = st.text_input(
     "Enter your query:",
     placeholder="What would you like to know?",
     key="query_input"
 )
-config = {"configurable": {"thread_id": str(st.session_state.thread_counter)}}
+config = {"configurable": {"thread_id": st.session_state.thread_id}}
 
 if query:
     with st.spinner("Processing your query..."):
         if query.lower() == 'new':
-            st.session_state.thread_counter += 1
-            config = {"configurable": {"thread_id": str(st.session_state.thread_counter)}}
+            st.session_state.thread_id = uuid.uuid4().hex
             st.warning("Started new conversation thread!")
             st.stop()
 
-        sql_result = st.session_state.query_analyzer.generate_sql_query(query)
+        vectordb = get_vectorstore()
+        query_analyzer = get_query_analyzer()
+
+        # optionally run the fallback vector search while the SQL path is busy
+        speculative = None
+        if SPECULATIVE_RETRIEVAL:
+            speculative = start_retrieval(vectordb, query, k=10,
+                                          bm25_index=get_bm25_index(),
+                                          categories=get_categories())
+
+        sql_result = query_analyzer.generate_sql_query(query)
         if not sql_result or 'sql_query' not in sql_result:
+            if speculative is not None:
+                speculative.cancel()
             st.warning("Could not generate SQL query from your request. Please try rephrasing.")
             st.stop()
         sql_query = sql_result['sql_query']
+        params = sql_result.get('params')
 
-        if not st.session_state.query_analyzer.validate_sql(sql_query):
+        if not query_analyzer.validate_sql(sql_query):
+            if speculative is not None:
+                speculative.cancel()
             st.warning("Generated SQL query appears to be invalid or unsafe. Please try a different query.")
             st.stop()
 
-        # a new connection for this query to avoid threading issues
-        conn = sqlite3.connect('ecommerce.db')
-        result_df = execute_sql_query(conn, sql_query)
-        conn.close()
+        result_df = execute_sql_query(get_db_pool(), sql_query, params)
 
         used_vectorstore = False
         if result_df.empty:
             # vectorstore to retrieve relevant documents
-            retriever = st.session_state.vectordb.as_retriever(
-                search_kwargs={
-                    "k": 10
-                    }
-                )
-            try:
-                relevant_docs = retriever.invoke(query)
-            except Exception as e:
-                st.warning(f"Vectorstore retrieval failed: {e}")
-                relevant_docs = []
+            if speculative is not None:
+                relevant_docs = speculative.result()
+            else:
+                relevant_docs = retrieve_documents(vectordb, query, k=10,
+                                                   bm25_index=get_bm25_index(),
+                                                   categories=get_categories())
             if not relevant_docs:
                 st.warning("No results found for your query in SQL or vectorstore. Try rephrasing or using different keywords.")
                 
-            formatted_results = "\n".join([
-                f"Document {i+1}:\n{doc.page_content}\nMetadata: {doc.metadata}"
-                for i, doc in enumerate(relevant_docs)
-            ])
+            formatted_results = get_context_builder().document_context(relevant_docs, query)
             used_vectorstore = True
         else:
+            if speculative is not None:
+                speculative.cancel()
      # format results for LLM context
-            formatted_results = format_sql_results(result_df, query)
+            formatted_results = get_context_builder().sql_context(result_df, query)
         # --- should end fallback logic ---
         
         if used_vectorstore:
@@ -137,7 +201,7 @@ if query:
             prompt = f"""
             Original Query: {query}
             
-            SQL Query Executed: {sql_query}
+            SQL Query Executed: {sql_query}{f' (parameters: {params})' if params else ''}
             
             Query Results:
             {formatted_results}
@@ -155,8 +219,11 @@ if query:
             Please provide a clear, helpful response based on the data above.
             """
         
-        input_messages = [HumanMessage(content=prompt)]
-        result = st.session_state.app.invoke({"messages": input_messages}, config)
-        
-        response_content = result["messages"][-1].content
-        st.success(f"Result: {response_content}") 
\ No newline at end of file
+        input_messages = [turn_message(prompt, query)]
+        response_cache = get_response_cache()
+        response_cache.set_data_version(get_data_version(get_db_pool()))
+
+    # outside the spinner, the answer is written as the model generates it
+    st.write_stream(stream_with_response_cache(
+        get_workflow(), config, input_messages, query, formatted_results, response_cache
+    )) 
\ No newline at end of file
@@ -0,0 +1,89 @@
+"""
+Recall vs latency of the Annoy candidate search against exact search.
+
+    python bench_ann.py [--build] [--queries 200] [--k 10] [--trees 10 50 100] [--search-k -1 2000 10000 50000]
+
+Runs on the numpy vector store (--build syncs it with the datasets first),
+with product titles as queries. For every tree count the index is built in a
+temporary directory, timed and sized, then queried at each search_k. Results
+go through the same rerank as NumpyVectorStore, so recall@k is what the
+retriever would see.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+from time import perf_counter
+import pandas as pd
+from ann_index import AnnoyCandidates
+from config import RERANK_FACTOR
+from data_loader import PRODUCT_DATA_PATH
+from quantization import normalize
+from vectorstore_builder import open_vectorstore, build_vectorstore
+
+
+def _run(search, query_vectors, truth):
+    timings, recalls = [], []
+    for vector, expected in zip(query_vectors, truth):
+        start = perf_counter()
+        hits = search(vector)
+        timings.append(perf_counter() - start)
+        recalls.append(len({row for row, _ in hits} & expected) / max(len(expected), 1))
+    percentiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    return statistics.mean(recalls), percentiles[49] * 1000, percentiles[98] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--build", action="store_true", help="sync the numpy store with the datasets first")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--trees", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--search-k", type=int, nargs="+", default=[-1, 2000, 10000, 50000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.build:
+        from data_loader import load_data
+        from doc_processor import iter_documents
+        store = build_vectorstore(iter_documents(load_data()), backend="numpy")
+    else:
+        store = open_vectorstore("numpy")
+    if not store.count():
+        raise SystemExit("The numpy vector store is empty, run with --build")
+    store.index, store.ann = None, None
+
+    titles = pd.read_csv(PRODUCT_DATA_PATH, usecols=['title'])['title'].dropna().unique().tolist()
+    queries = random.Random(args.seed).sample(titles, min(args.queries, len(titles)))
+    query_vectors = normalize(store.embeddings.embed_documents(queries))
+
+    exact = [store._search([vector], args.k)[0] for vector in query_vectors]
+    truth = [{row for row, _ in hits} for hits in exact]
+    dim = store._search_dim()
+
+    print(f"{store.count()} chunks, {len(queries)} queries, k={args.k}, {dim} dims, "
+          f"{RERANK_FACTOR}x candidates reranked")
+    print(f"{'trees':>6} {'search_k':>9} {'recall':>8} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'MiB':>7}")
+    recall, p50, p99 = _run(lambda v: store._search([v], args.k)[0], query_vectors, truth)
+    print(f"{'exact':>6} {'':>9} {recall:>8.3f} {p50:>8.2f} {p99:>8.2f}")
+
+    with tempfile.TemporaryDirectory() as path:
+        for n_trees in args.trees:
+            start = perf_counter()
+            ann = AnnoyCandidates.build(store.vectors, dim, n_trees, path)
+            build_seconds = perf_counter() - start
+            size = os.path.getsize(os.path.join(path, AnnoyCandidates.file_name(dim, n_trees))) / 2**20
+            store.ann = ann
+            for search_k in args.search_k:
+                ann.search_k = search_k
+                recall, p50, p99 = _run(lambda v: store._ann_search(v, args.k), query_vectors, truth)
+                print(f"{n_trees:>6} {search_k:>9} {recall:>8.3f} {p50:>8.2f} {p99:>8.2f} "
+                      f"{build_seconds:>8.1f} {size:>7.1f}")
+            # release the memory map so the temporary directory can be removed
+            ann.close()
+            store.ann = None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Latency of the api.py record endpoints over the full order dataset: indexed lookups against the previous scans.
+
+    python bench_api.py [--path Order_Data_Dataset.csv] [--requests 300] [--limit 100] [--fields Product,Sales]
+
+For each filter endpoint, random parameters drawn from the data are answered
+three ways:
+- the previous handler: a boolean mask or str.contains scan of the whole
+  table, serialized in full;
+- the indexed lookup plus one page, with the per-term result caches cleared
+  so every call pays for its lookup;
+- a GET through the FastAPI app in-process.
+"""
+import argparse
+import os
+import random
+import statistics
+from time import perf_counter
+import pandas as pd
+
+
+def _percentiles(timings):
+    percentiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    return percentiles[49] * 1000, percentiles[98] * 1000
+
+
+def _time(fn, params):
+    timings = []
+    for param in params:
+        start = perf_counter()
+        fn(param)
+        timings.append(perf_counter() - start)
+    return _percentiles(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--path", help="order dataset CSV, defaults to api.DATASET_PATH")
+    parser.add_argument("--requests", type=int, default=300, help="requests per endpoint")
+    parser.add_argument("--limit", type=int, default=100, help="page size of the indexed endpoints")
+    parser.add_argument("--fields", help="comma separated columns to project, all when omitted")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.path:
+        # api loads its dataset on import
+        os.environ["ORDER_DATASET_PATH"] = args.path
+    start = perf_counter()
+    import api
+    from fastapi.testclient import TestClient
+    dataset = api.data
+    print(f"Dataset: {len(dataset.rows)} orders, loaded and indexed in {perf_counter() - start:.2f}s")
+
+    # the table the previous handlers scanned, blanks filled in as before
+    df = pd.DataFrame(dataset.rows)
+    rng = random.Random(args.seed)
+    customers = [int(c) for c in rng.choices(list(dataset.customers), k=args.requests)]
+    # partial, mixed case terms, as the substring match allows
+    categories = [value[:rng.randint(3, len(value))].upper() for value in rng.choices(
+        [v for v in df["Product_Category"].unique() if len(v) >= 3], k=args.requests)]
+    priorities = [value.lower() for value in rng.choices(
+        [v for v in df["Order_Priority"].unique() if v], k=args.requests)]
+    profits = [rng.uniform(dataset.sorted_profit[0], dataset.sorted_profit[-1]) for _ in range(args.requests)]
+    fields, _ = dataset.fields(args.fields)
+
+    def indexed(lookup):
+        def run(param):
+            for cache in api._RESULT_CACHES:
+                cache.cache_clear()
+            positions = lookup(param)
+            return dataset.page(positions, args.limit, 0, fields)
+        return run
+
+    endpoints = [
+        ("customer", customers,
+         lambda c: api._json(df[df["Customer_Id"] == c].to_dict(orient="records")),
+         indexed(lambda c: dataset.customers.get(c, ())),
+         "/data/customer/{}"),
+        ("product-category", categories,
+         lambda c: api._json(df[df["Product_Category"].str.contains(c, case=False, na=False)].to_dict(orient="records")),
+         indexed(lambda c: api._category_rows(dataset, c)),
+         "/data/product-category/{}"),
+        ("order-priority", priorities,
+         lambda p: api._json(df[df["Order_Priority"].str.contains(p, case=False, na=False)].to_dict(orient="records")),
+         indexed(lambda p: api._priority_rows(dataset, p)),
+         "/data/order-priority/{}"),
+        ("high-profit", profits,
+         lambda m: api._json(df[df["Profit"] > m].to_dict(orient="records")),
+         indexed(lambda m: api._high_profit_rows(dataset, m)),
+         "/data/high-profit-products?min_profit={}"),
+    ]
+
+    client = TestClient(api.app)
+    query = f"limit={args.limit}" + (f"&fields={args.fields}" if args.fields else "")
+    print(f"{args.requests} requests per endpoint, page size {args.limit}\n")
+    print(f"{'endpoint':<18} {'scan p50':>9} {'scan p99':>9} {'index p50':>10} {'index p99':>10} "
+          f"{'http p50':>9} {'http p99':>9}   (ms)")
+    for name, params, scan, lookup, url in endpoints:
+        scan_p50, scan_p99 = _time(scan, params)
+        index_p50, index_p99 = _time(lookup, params)
+        sep = "&" if "?" in url else "?"
+        http_p50, http_p99 = _time(lambda param: client.get(url.format(param) + sep + query), params)
+        print(f"{name:<18} {scan_p50:9.2f} {scan_p99:9.2f} {index_p50:10.3f} {index_p99:10.3f} "
+              f"{http_p50:9.2f} {http_p99:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark LIKE '%term%' scans against their FTS5 rewrite on the real dataset.
+
+    python bench_fts.py [--repeat 20]
+
+Loads (or reuses) ecommerce.db through setup_database, then times each query in
+both forms and checks that they return the same rows (the same row count for
+LIMIT queries, which may legitimately pick different rows).
+"""
+import argparse
+import statistics
+from time import perf_counter
+from database import setup_database, rewrite_like_to_fts
+
+QUERIES = [
+    "SELECT * FROM products WHERE title LIKE '%microphone%' LIMIT 50;",
+    "SELECT title, price FROM products WHERE title LIKE '%BOYA%';",
+    "SELECT COUNT(*) FROM products WHERE description LIKE '%wireless%';",
+    "SELECT title FROM products WHERE features LIKE '%bluetooth%' AND categories LIKE '%Headphones%';",
+    "SELECT * FROM orders WHERE Product LIKE '%watch%' LIMIT 50;",
+    "SELECT COUNT(*) FROM orders WHERE Product_Category LIKE '%fashion%';",
+    "SELECT Customer_Id, Product FROM orders WHERE Product LIKE '%speakers%';",
+]
+
+
+def _time_query(conn, sql, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        rows = conn.execute(sql).fetchall()
+        timings.append(perf_counter() - start)
+    return statistics.median(timings) * 1000, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    conn = setup_database()
+    orders, products = (conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("orders", "products"))
+    print(f"Dataset: {orders} orders, {products} products, median of {args.repeat} runs\n")
+    print(f"{'LIKE ms':>9} {'FTS ms':>9} {'speedup':>8} {'rows':>6}  query")
+
+    for sql in QUERIES:
+        fts_sql = rewrite_like_to_fts(sql)
+        like_ms, like_rows = _time_query(conn, sql, args.repeat)
+        fts_ms, fts_rows = _time_query(conn, fts_sql, args.repeat)
+        if "LIMIT" in sql.upper():
+            same = len(like_rows) == len(fts_rows)
+        else:
+            same = sorted(like_rows, key=repr) == sorted(fts_rows, key=repr)
+        rows = str(len(like_rows)) if same else f"{len(like_rows)}!={len(fts_rows)}"
+        print(f"{like_ms:9.2f} {fts_ms:9.2f} {like_ms / max(fts_ms, 1e-9):7.1f}x {rows:>6}  {sql}")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Index size, query latency and recall@k of MRL truncation and quantization settings.
+
+    python bench_quantization.py [--build] [--queries 200] [--k 10] [--dims 512 256 128]
+
+Runs on the numpy vector store (--build syncs it with the datasets first).
+Queries are product titles. Ground truth is exact search over the full
+dimension float vectors. Each setting is reported twice: "coarse" is the
+compact index alone, and "rerank" rescoring RERANK_FACTOR * k candidates
+against the full vectors, which is what NumpyVectorStore does.
+"""
+import argparse
+import random
+import statistics
+from time import perf_counter
+import pandas as pd
+from config import RERANK_FACTOR
+from data_loader import PRODUCT_DATA_PATH
+from quantization import QUANTIZATIONS, SearchIndex
+from vectorstore_builder import open_vectorstore, build_vectorstore
+
+
+def _evaluate(store, query_vectors, k, truth):
+    timings, recalls = [], []
+    for vector, expected in zip(query_vectors, truth):
+        start = perf_counter()
+        hits = store._search([vector], k)[0]
+        timings.append(perf_counter() - start)
+        recalls.append(len({row for row, _ in hits} & expected) / max(len(expected), 1))
+    return statistics.mean(recalls), statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--build", action="store_true", help="sync the numpy store with the datasets first")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dims", type=int, nargs="+", default=[512, 256, 128])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.build:
+        from data_loader import load_data
+        from doc_processor import iter_documents
+        store = build_vectorstore(iter_documents(load_data()), backend="numpy")
+    else:
+        store = open_vectorstore("numpy")
+    if not store.count():
+        raise SystemExit("The numpy vector store is empty, run with --build")
+
+    titles = pd.read_csv(PRODUCT_DATA_PATH, usecols=['title'])['title'].dropna().unique().tolist()
+    queries = random.Random(args.seed).sample(titles, min(args.queries, len(titles)))
+    query_vectors = store.embeddings.embed_documents(queries)
+
+    full_dim = store.vectors.shape[1]
+    store.index = None
+    truth = [{row for row, _ in hits} for hits in store._search(query_vectors, args.k)]
+    full_bytes = store.vectors.nbytes
+
+    print(f"{store.count()} chunks, {len(queries)} queries, recall@{args.k} against exact {full_dim}-dim search")
+    print(f"{'dim':>5} {'quant':<7} {'index MiB':>10} {'coarse recall':>14} {'rerank recall':>14} "
+          f"{'coarse ms':>10} {'rerank ms':>10}")
+    print(f"{full_dim:>5} {'exact':<7} {full_bytes / 2**20:>10.1f} {1.0:>14.3f} {'':>14} "
+          f"{_evaluate(store, query_vectors, args.k, truth)[1]:>10.2f}")
+
+    dims = [full_dim] + sorted({d for d in args.dims if d < full_dim}, reverse=True)
+    for dim in dims:
+        for quantization in QUANTIZATIONS:
+            if dim == full_dim and quantization == "none":
+                continue
+            store.index = SearchIndex.build(store.vectors, dim, quantization)
+            store.rerank_factor = 1
+            coarse_recall, coarse_ms = _evaluate(store, query_vectors, args.k, truth)
+            store.rerank_factor = RERANK_FACTOR
+            rerank_recall, rerank_ms = _evaluate(store, query_vectors, args.k, truth)
+            print(f"{dim:>5} {quantization:<7} {store.index.nbytes / 2**20:>10.1f} {coarse_recall:>14.3f} "
+                  f"{rerank_recall:>14.3f} {coarse_ms:>10.2f} {rerank_ms:>10.2f}")
+
+    print(f"\nrerank reads {RERANK_FACTOR} * k rows of the full {full_bytes / 2**20:.1f} MiB "
+          f"embeddings.npy per query, memory-mapped, so they need not stay resident")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Recall and latency of dense-only vs hybrid BM25 + dense retrieval.
+
+    python bench_retrieval.py [--queries 200] [--k 5]
+
+Builds (or reuses) the vector store and BM25 index, then uses product titles
+from the store as queries. A query counts as a hit when a chunk of that
+product is among the top k results.
+"""
+import argparse
+import random
+import statistics
+from time import perf_counter
+from bm25_index import load_or_build_bm25_index
+from data_loader import load_data
+from doc_processor import iter_documents
+from retrieval import retrieve_documents
+from vectorstore_builder import build_vectorstore
+
+
+def _evaluate(vectordb, samples, k, bm25_index=None):
+    hits = 0
+    timings = []
+    for title in samples:
+        start = perf_counter()
+        docs = retrieve_documents(vectordb, title, k=k, bm25_index=bm25_index)
+        timings.append(perf_counter() - start)
+        hits += any(doc.metadata.get('title') == title for doc in docs)
+    percentiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    return hits / len(samples), percentiles[49] * 1000, percentiles[94] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectordb = build_vectorstore(iter_documents(load_data()))
+    bm25_index = load_or_build_bm25_index(vectordb)
+
+    products = vectordb.get(where={"dataset_type": "product"}, include=["metadatas"])
+    titles = sorted({m['title'] for m in products['metadatas'] if m.get('title')})
+    samples = random.Random(args.seed).sample(titles, min(args.queries, len(titles)))
+
+    print(f"{len(samples)} product title queries, k={args.k}")
+    print(f"{'mode':<8} {'recall':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for mode, index in (("dense", None), ("hybrid", bm25_index)):
+        recall, p50, p95 = _evaluate(vectordb, samples, args.k, index)
+        print(f"{mode:<8} {recall:>8.3f} {p50:>9.2f} {p95:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
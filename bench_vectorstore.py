@@ -0,0 +1,137 @@
+"""
+Compare the Chroma and numpy vector store backends: open time, query latency and RSS.
+
+    python bench_vectorstore.py [--build] [--queries 200] [--k 5] [--batch 32]
+
+Each backend is measured in its own child process, so resident memory is not
+shared between them. RSS is reported after loading the embedding model (the
+baseline), after opening the store and after running the queries. Query
+latency excludes embedding the query: the queries (product titles) are
+embedded once up front and searched by vector. --build first syncs both stores
+with the datasets.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+import numpy as np
+import pandas as pd
+import psutil
+from data_loader import PRODUCT_DATA_PATH
+
+
+def _rss_mb():
+    return psutil.Process().memory_info().rss / 2**20
+
+
+def _percentile_ms(timings, q):
+    return 1000 * (statistics.quantiles(timings, n=100)[q - 1] if len(timings) > 1 else timings[0])
+
+
+def run_child(backend, queries_path, k, batch):
+    from embedding_service import get_embedding_service
+    from vectorstore_builder import open_vectorstore
+
+    embedding_model = get_embedding_service()
+    with open(queries_path, "r", encoding="utf-8") as f:
+        queries = json.load(f)
+    vectors = embedding_model.embed_documents(queries)
+    rss_base = _rss_mb()
+
+    start = perf_counter()
+    vectordb = open_vectorstore(backend, embedding_model)
+    open_ms = (perf_counter() - start) * 1000
+    rss_open = _rss_mb()
+
+    timings, results = [], []
+    for vector in vectors:
+        start = perf_counter()
+        docs = vectordb.similarity_search_by_vector(vector, k=k)
+        timings.append(perf_counter() - start)
+        results.append([doc.id for doc in docs])
+
+    # batched search: one call for `batch` queries
+    start = perf_counter()
+    for i in range(0, len(vectors), batch):
+        if backend == "numpy":
+            vectordb._search(np.asarray(vectors[i:i + batch]), k)
+        else:
+            vectordb._collection.query(query_embeddings=vectors[i:i + batch], n_results=k)
+    batch_ms = (perf_counter() - start) * 1000 / len(vectors)
+
+    print(json.dumps({
+        'backend': backend,
+        'chunks': vectordb._collection.count(),
+        'open_ms': open_ms,
+        'p50_ms': _percentile_ms(timings, 50),
+        'p95_ms': _percentile_ms(timings, 95),
+        'batched_ms_per_query': batch_ms,
+        'rss_base_mb': rss_base,
+        'rss_open_mb': rss_open,
+        'rss_after_mb': _rss_mb(),
+        'results': results,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--build", action="store_true", help="sync both stores with the datasets first")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--queries-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.queries_path, args.k, args.batch)
+        return
+
+    if args.build:
+        from data_loader import load_data
+        from doc_processor import iter_documents
+        from vectorstore_builder import build_vectorstore
+        for backend in ("chroma", "numpy"):
+            build_vectorstore(iter_documents(load_data()), backend=backend)
+
+    titles = pd.read_csv(PRODUCT_DATA_PATH, usecols=['title'])['title'].dropna().unique().tolist()
+    queries = random.Random(args.seed).sample(titles, min(args.queries, len(titles)))
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+        json.dump(queries, f)
+
+    reports = {}
+    try:
+        for backend in ("chroma", "numpy"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", backend, "--queries-path", f.name,
+                 "--k", str(args.k), "--batch", str(args.batch)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            reports[backend] = json.loads(output.strip().splitlines()[-1])
+    finally:
+        os.remove(f.name)
+
+    print(f"{len(queries)} queries, k={args.k}, batch={args.batch}")
+    print(f"{'backend':<8} {'chunks':>7} {'open ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'batch ms/q':>11} "
+          f"{'RSS base':>9} {'+open':>7} {'+search':>8}")
+    for backend, r in reports.items():
+        print(f"{backend:<8} {r['chunks']:>7} {r['open_ms']:>9.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['batched_ms_per_query']:>11.2f} {r['rss_base_mb']:>8.0f}M "
+              f"{r['rss_open_mb'] - r['rss_base_mb']:>6.0f}M {r['rss_after_mb'] - r['rss_open_mb']:>7.0f}M")
+
+    # numpy ranks by exact cosine similarity, Chroma by approximate (HNSW) L2 distance
+    overlap = [
+        len(set(a) & set(b)) / max(len(b), 1)
+        for a, b in zip(reports['chroma']['results'], reports['numpy']['results'])
+    ]
+    print(f"top-{args.k} overlap between backends: {statistics.mean(overlap):.3f}")
+
+
+if __name__ == "__main__":
+    main()
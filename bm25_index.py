@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from time import time
+import numpy as np
+from config import BM25_INDEX_DIR, VECTORSTORE_MANIFEST
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# chunks read from the vector store per page while building
+READ_BATCH_SIZE = 5000
+
+# metadata kept per chunk so searches can be restricted like the vector store's filters
+FILTER_FIELDS = ('dataset_type', 'main_category', 'Customer_Id')
+
+# bumped whenever the on-disk layout changes, older indexes are rebuilt
+FORMAT_VERSION = 2
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_RE.findall(text.lower())
+
+
+def manifest_digest(path: str = VECTORSTORE_MANIFEST) -> str:
+    """
+    Digest of the vector store build manifest; the index is stale when it changes.
+    """
+    if not os.path.exists(path):
+        return ""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the vector store chunks, with array backed postings.
+
+    Terms are kept sorted in one array (looked up with `searchsorted`), and the
+    postings of term i are `doc_idx[offsets[i]:offsets[i + 1]]` with matching
+    term frequencies in `tfs`, i.e. CSR layout. Everything is stored as plain
+    .npy files, so loading memory-maps them instead of rebuilding dicts in
+    Python.
+    """
+
+    ARRAYS = ('terms', 'offsets', 'doc_idx', 'tfs', 'doc_len', 'ids')
+
+    def __init__(self, terms, offsets, doc_idx, tfs, doc_len, ids, fields=None,
+                 k1=1.5, b=0.75, source_digest=""):
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_idx = doc_idx
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.ids = ids
+        self.fields = fields or {}
+        self.k1 = k1
+        self.b = b
+        self.source_digest = source_digest
+        self.avg_len = float(doc_len.mean()) if len(doc_len) else 0.0
+        # per document part of the BM25 denominator, computed once
+        self._norm = (k1 * (1 - b + b * doc_len / max(self.avg_len, 1e-9))).astype(np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, items, k1=1.5, b=0.75, source_digest=""):
+        """
+        Build the index from an iterable of (chunk_id, text, metadata).
+        """
+        vocab = {}
+        term_ids, doc_ids, counts = [], [], []
+        ids, doc_len = [], []
+        fields = {field: [] for field in FILTER_FIELDS}
+        for doc, (chunk_id, text, metadata) in enumerate(items):
+            tokens = tokenize(text)
+            ids.append(chunk_id)
+            doc_len.append(len(tokens))
+            for field, values in fields.items():
+                values.append(str((metadata or {}).get(field, "")))
+            uniq, tf = np.unique(tokens, return_counts=True) if tokens else ((), ())
+            for token, count in zip(uniq, tf):
+                term_ids.append(vocab.setdefault(token, len(vocab)))
+                doc_ids.append(doc)
+                counts.append(count)
+
+        # renumber terms in sorted order so lookups can use searchsorted
+        terms = np.array(sorted(vocab), dtype=str)
+        remap = np.empty(len(vocab), dtype=np.int64)
+        remap[[vocab[t] for t in terms]] = np.arange(len(terms))
+        term_ids = remap[np.asarray(term_ids, dtype=np.int64)]
+
+        order = np.lexsort((np.asarray(doc_ids), term_ids))
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(terms)), out=offsets[1:])
+
+        return cls(
+            terms=terms,
+            offsets=offsets,
+            doc_idx=np.asarray(doc_ids, dtype=np.int32)[order],
+            tfs=np.minimum(np.asarray(counts), np.iinfo(np.uint16).max).astype(np.uint16)[order],
+            doc_len=np.asarray(doc_len, dtype=np.float32),
+            ids=np.array(ids, dtype=str),
+            fields={field: np.array(values, dtype=str) for field, values in fields.items()},
+            k1=k1,
+            b=b,
+            source_digest=source_digest
+        )
+
+    def save(self, path: str = BM25_INDEX_DIR):
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        for field, values in self.fields.items():
+            np.save(os.path.join(path, f"field_{field}.npy"), values)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                'version': FORMAT_VERSION,
+                'k1': self.k1,
+                'b': self.b,
+                'source_digest': self.source_digest,
+                'fields': list(self.fields)
+            }, f)
+
+    @classmethod
+    def load(cls, path: str = BM25_INDEX_DIR):
+        meta = read_meta(path)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in cls.ARRAYS}
+        fields = {
+            field: np.load(os.path.join(path, f"field_{field}.npy"), mmap_mode='r')
+            for field in meta['fields']
+        }
+        return cls(**arrays, fields=fields, k1=meta['k1'], b=meta['b'], source_digest=meta['source_digest'])
+
+    def mask(self, conditions: dict):
+        """
+        Boolean array of the chunks whose metadata matches every condition, or
+        None when there is nothing to filter on.
+        """
+        mask = None
+        for field, value in conditions.items():
+            if field not in self.fields:
+                continue
+            matches = self.fields[field] == str(value)
+            mask = matches if mask is None else mask & matches
+        return mask
+
+    def search(self, query: str, k: int = 10, mask=None):
+        """
+        Top-k (chunk_id, score) pairs for `query`. `mask` optionally restricts
+        the search to a boolean array of allowed documents.
+        """
+        n_docs = len(self.ids)
+        tokens = np.unique(tokenize(query))
+        if not n_docs or not len(tokens):
+            return []
+        positions = np.searchsorted(self.terms, tokens)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for token, pos in zip(tokens, positions):
+            if pos >= len(self.terms) or self.terms[pos] != token:
+                continue
+            start, end = self.offsets[pos], self.offsets[pos + 1]
+            docs = self.doc_idx[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            idf = np.log1p((n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            # postings hold each document once per term, plain fancy-index add is safe
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._norm[docs])
+
+        if mask is not None:
+            scores[~mask] = 0.0
+        k = min(k, n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(str(self.ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+def read_meta(path: str = BM25_INDEX_DIR):
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _iter_store_chunks(vectordb):
+    collection = vectordb._collection
+    total = collection.count()
+    for offset in range(0, total, READ_BATCH_SIZE):
+        page = collection.get(include=["documents", "metadatas"], limit=READ_BATCH_SIZE, offset=offset)
+        yield from zip(page["ids"], page["documents"], page["metadatas"])
+
+
+def load_or_build_bm25_index(vectordb, path: str = BM25_INDEX_DIR):
+    """
+    Load the persisted BM25 index, rebuilding it from the vector store's chunks
+    only when the store changed since it was built.
+    """
+    digest = manifest_digest()
+    meta = read_meta(path)
+    if meta is not None:
+        if meta.get('version') == FORMAT_VERSION and meta['source_digest'] == digest:
+            index = BM25Index.load(path)
+            logger.info(f"Loaded BM25 index over {len(index)} chunks from {path}")
+            return index
+        logger.info("Vector store or index format changed since the BM25 index was built, rebuilding")
+
+    start = time()
+    index = BM25Index.build(_iter_store_chunks(vectordb), source_digest=digest)
+    index.save(path)
+    logger.info(f"Built BM25 index over {len(index)} chunks ({len(index.terms)} terms) in {time() - start:.1f}s")
+    return BM25Index.load(path)
@@ -0,0 +1,386 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from time import perf_counter, time
+from typing import Iterator, Optional
+import numpy as np
+from langchain_core.messages import AIMessage, AIMessageChunk
+from config import SQL_CACHE_SIMILARITY, SQL_CACHE_SIZE, SQL_CACHE_TTL
+from config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a user query: lowercased, single spaced, without
+    surrounding quotes or trailing punctuation.
+    """
+    query = re.sub(r'\s+', ' ', query.lower()).strip()
+    return query.strip('"\'').rstrip('?!. ')
+
+
+def query_entities(query: str) -> tuple:
+    """
+    Literal values in a query (numbers and quoted strings). Two queries can only
+    share a cached answer if these match, embeddings alone can't tell
+    "customer 37077" from "customer 37078".
+    """
+    return tuple(sorted(re.findall(r'\d+(?:\.\d+)?|"[^"]*"|\'[^\']*\'', query)))
+
+
+class LRUCache:
+    """
+    Thread-safe LRU mapping with an optional time-to-live per entry.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and time() - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, stored_at = item
+            if self._expired(stored_at):
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value, stored_at: float = None):
+        with self._lock:
+            self._data[key] = (value, time() if stored_at is None else stored_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[0]
+
+    def items(self):
+        """
+        Snapshot of the live (key, value, stored_at) entries, oldest first.
+        """
+        with self._lock:
+            expired = [k for k, (_, stored_at) in self._data.items() if self._expired(stored_at)]
+            for key in expired:
+                del self._data[key]
+            return [(k, v, stored_at) for k, (v, stored_at) in self._data.items()]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SemanticSQLCache:
+    """
+    Two level cache of generated SQL for natural language queries.
+
+    Level one is an exact match on the normalized query text. Level two embeds
+    the query with the already loaded embedding model and reuses the SQL of the
+    most similar cached query if the cosine similarity reaches `threshold` and
+    both queries mention the same literal values.
+    """
+
+    def __init__(self, embedding_model=None, threshold: float = SQL_CACHE_SIMILARITY,
+                 max_size: int = SQL_CACHE_SIZE, ttl: float = SQL_CACHE_TTL, path: str = None):
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.path = path
+        self._entries = LRUCache(max_size, ttl)
+        self._embeddings = LRUCache(max_size)
+        self._stats_lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        if path:
+            self.load()
+
+    def _embed(self, key: str):
+        vector = self._embeddings.get(key)
+        if vector is None:
+            vector = np.asarray(self.embedding_model.embed_query(key), dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+            self._embeddings.put(key, vector)
+        return vector
+
+    def _count(self, counter: str):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def lookup(self, query: str):
+        """
+        Return a copy of the cached SQL result for `query` (with the matched
+        entry under 'cache_key' and the level under 'cache_hit'), or None.
+        """
+        key = normalize_query(query)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._count('exact_hits')
+            return dict(entry['result'], cache_key=key, cache_hit='exact')
+
+        if self.embedding_model is not None:
+            entries = [(k, e) for k, e, _ in self._entries.items() if e['entities'] == query_entities(key)]
+            if entries:
+                matrix = np.stack([self._embed(k) for k, _ in entries])
+                scores = matrix @ self._embed(key)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    match_key, entry = entries[best]
+                    self._entries.get(match_key)  # refresh its LRU position
+                    self._count('semantic_hits')
+                    logger.info(f"Semantic cache hit ({scores[best]:.3f}) for '{key}' via '{match_key}'")
+                    return dict(entry['result'], cache_key=match_key, cache_hit='semantic')
+
+        self._count('misses')
+        return None
+
+    def store(self, query: str, result: dict):
+        key = normalize_query(query)
+        self._entries.put(key, {'result': dict(result), 'entities': query_entities(key)})
+
+    def discard(self, key: str):
+        """
+        Drop a cached entry, e.g. when its SQL no longer validates.
+        """
+        self._entries.pop(key)
+        self._count('invalidations')
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'exact_hits': self.exact_hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
+
+    def save(self, path: str = None):
+        path = path or self.path
+        if not path:
+            return
+        entries = [
+            {'query': key, 'result': entry['result'], 'stored_at': stored_at}
+            for key, entry, stored_at in self._entries.items()
+        ]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved {len(entries)} cached SQL queries to {path}")
+
+    def load(self, path: str = None):
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable SQL cache {path}: {e}")
+            return
+        for item in entries:
+            key = item['query']
+            self._entries.put(
+                key,
+                {'result': item['result'], 'entities': query_entities(key)},
+                stored_at=item['stored_at']
+            )
+        logger.info(f"Loaded {len(self._entries)} cached SQL queries from {path}")
+
+
+def thread_digest(messages) -> str:
+    """
+    Digest of the conversation so far, so a cached answer is only reused when
+    the model would have seen exactly the same history.
+    """
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(message.type.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(str(message.content).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache of final answers keyed by the normalized query, a hash of the
+    formatted results the answer was written from and a digest of the thread's
+    earlier messages. Entries are dropped when the underlying data version
+    changes.
+    """
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self._entries = LRUCache(max_size, ttl)
+        self._lock = threading.Lock()
+        self.data_version = None
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+
+    @staticmethod
+    def _key(query: str, formatted_results: str, history) -> str:
+        payload = "\0".join([
+            normalize_query(query),
+            hashlib.sha256(formatted_results.encode("utf-8")).hexdigest(),
+            thread_digest(history),
+        ])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def set_data_version(self, data_version):
+        """
+        Record the current data version, clearing every entry if it changed.
+        """
+        with self._lock:
+            changed = self.data_version is not None and data_version != self.data_version
+            self.data_version = data_version
+        if changed:
+            self._entries.clear()
+            logger.info("Data changed, response cache cleared")
+
+    def get(self, query: str, formatted_results: str, history) -> Optional[str]:
+        entry = self._entries.get(self._key(query, formatted_results, history))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.time_saved += entry['elapsed']
+        return entry['answer']
+
+    def put(self, query: str, formatted_results: str, history, answer: str, elapsed: float):
+        """
+        Store an answer together with how long the model took to produce it.
+        Empty answers are not stored, a blank hit would repeat them forever.
+        """
+        if not answer or not answer.strip():
+            return
+        self._entries.put(
+            self._key(query, formatted_results, history),
+            {'answer': answer, 'elapsed': elapsed}
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'time_saved_sec': round(self.time_saved, 3),
+            }
+
+
+def _with_cached_answer(config, answer: str) -> dict:
+    """
+    Config running the workflow with `answer` in place of the model call, so a
+    cached turn is stored, windowed and tracked exactly like a generated one.
+    """
+    return {**config, "configurable": {**config["configurable"], "cached_answer": answer}}
+
+
+def invoke_with_response_cache(app, config, input_messages, query: str, formatted_results: str,
+                               cache: ResponseCache) -> str:
+    """
+    Run the answer workflow for one turn, serving it from `cache` when possible.
+
+    On a hit the turn still runs through the workflow with the cached answer
+    standing in for the model, so the thread is compacted, windowed and
+    tracked exactly as if the model had been called.
+    """
+    history = app.get_state(config).values.get("messages", [])
+    answer = cache.get(query, formatted_results, history)
+    if answer is not None:
+        logger.info("Answer served from the response cache")
+        app.invoke({"messages": input_messages}, _with_cached_answer(config, answer))
+        return answer
+
+    start = time()
+    result = app.invoke({"messages": input_messages}, config)
+    answer = result["messages"][-1].content
+    cache.put(query, formatted_results, history, answer, time() - start)
+    return answer
+
+
+def stream_with_response_cache(app, config, input_messages, query: str, formatted_results: str,
+                               cache: ResponseCache) -> Iterator[str]:
+    """
+    Streaming invoke_with_response_cache: yields the answer text as the model
+    produces it (a cache hit is yielded whole). The answer is cached only once
+    the stream has run to the end, never a partial one.
+    """
+    history = app.get_state(config).values.get("messages", [])
+    answer = cache.get(query, formatted_results, history)
+    if answer is not None:
+        logger.info("Answer served from the response cache")
+        app.invoke({"messages": input_messages}, _with_cached_answer(config, answer))
+        yield answer
+        return
+
+    start = perf_counter()
+    first_token = None
+    chunks = []
+    for chunk, metadata in app.stream({"messages": input_messages}, config, stream_mode="messages"):
+        # only the answer model's tokens, not the messages the node writes back
+        if not isinstance(chunk, AIMessageChunk) or metadata.get("langgraph_node") != "model" or not chunk.content:
+            continue
+        if first_token is None:
+            first_token = perf_counter() - start
+        chunks.append(chunk.content)
+        yield chunk.content
+    if not chunks:
+        # a model that does not stream tokens returns its answer in one piece,
+        # read it from the thread the node wrote it to
+        messages = app.get_state(config).values.get("messages", [])
+        if messages and isinstance(messages[-1], AIMessage) and messages[-1].content:
+            chunks.append(messages[-1].content)
+            yield messages[-1].content
+    elapsed = perf_counter() - start
+    logger.info(f"Answer streamed: first token after {first_token or elapsed:.3f}s, total {elapsed:.3f}s")
+    cache.put(query, formatted_results, history, "".join(chunks), elapsed)
+
+
+async def ainvoke_with_response_cache(app, config, input_messages, query: str, formatted_results: str,
+                                      cache: ResponseCache) -> str:
+    """
+    Async invoke_with_response_cache, for the asyncio pipeline.
+    """
+    state = await app.aget_state(config)
+    history = state.values.get("messages", [])
+    answer = cache.get(query, formatted_results, history)
+    if answer is not None:
+        logger.info("Answer served from the response cache")
+        await app.ainvoke({"messages": input_messages}, _with_cached_answer(config, answer))
+        return answer
+
+    start = time()
+    result = await app.ainvoke({"messages": input_messages}, config)
+    answer = result["messages"][-1].content
+    cache.put(query, formatted_results, history, answer, time() - start)
+    return answer
@@ -0,0 +1,83 @@
+from contextlib import asynccontextmanager
+from typing import Optional
+import uuid
+from fastapi import FastAPI
+from pydantic import BaseModel
+from config import SQL_CACHE_PATH, HYBRID_RETRIEVAL
+from bm25_index import load_or_build_bm25_index
+from caching import SemanticSQLCache, ResponseCache
+from data_loader import load_data
+from embedding_service import get_embedding_service
+from database import setup_database, ConnectionPool
+from doc_processor import iter_documents
+from memory import ConversationMemory
+from model_config import setup_model, setup_workflow
+from pipeline import ChatPipeline
+from query_analyzer import QueryAnalyzer
+from vectorstore_builder import build_vectorstore
+
+# Chat server for the async pipeline, run with:
+#   uvicorn chat_api:app --host 0.0.0.0 --port 8001
+
+resources = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_database().close()
+    pool = ConnectionPool()
+    vectordb = build_vectorstore(iter_documents(load_data()))
+    bm25_index = load_or_build_bm25_index(vectordb) if HYBRID_RETRIEVAL else None
+
+    llm = setup_model()
+    # the pipeline runs the workflow with ainvoke, so the memory uses the async saver
+    memory = await ConversationMemory.aopen()
+    sql_cache = SemanticSQLCache(embedding_model=vectordb.embeddings, path=SQL_CACHE_PATH)
+    query_analyzer = QueryAnalyzer(llm=llm, cache=sql_cache)
+    pipeline = ChatPipeline(
+        query_analyzer=query_analyzer,
+        workflow=setup_workflow(llm, memory),
+        pool=pool,
+        vectordb=vectordb,
+        bm25_index=bm25_index,
+        response_cache=ResponseCache()
+    )
+    resources.update(pipeline=pipeline, pool=pool, sql_cache=sql_cache, memory=memory)
+    yield
+    sql_cache.save()
+    pipeline.close()
+    pool.close()
+    await memory.aclose()
+
+
+app = FastAPI(title="E-commerce Chat API", description="Async chat endpoint over the RAG pipeline", lifespan=lifespan)
+
+
+class ChatRequest(BaseModel):
+    query: str
+    # omitted on the first turn: a new thread is created and returned
+    thread_id: Optional[str] = None
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    """Answer a customer query within a conversation thread, starting a new one when none is given."""
+    thread_id = request.thread_id or uuid.uuid4().hex
+    response = await resources['pipeline'].answer(request.query, thread_id)
+    response["thread_id"] = thread_id
+    return response
+
+
+@app.get("/stats")
+def stats():
+    """Pool, cache, embedding, SQL generation, prompt context and conversation memory statistics."""
+    pipeline = resources['pipeline']
+    return {
+        "db_pool": resources['pool'].stats(),
+        "sql_cache": resources['sql_cache'].stats(),
+        "response_cache": pipeline.response_cache.stats(),
+        "embedding": get_embedding_service().stats(),
+        "sql_generation": pipeline.query_analyzer.latency_report(),
+        "context": pipeline.context_builder.stats(),
+        "memory": resources['memory'].stats(),
+    }
@@ -1,8 +1,20 @@
 import os
 import requests
 import getpass
-if not os.environ.get("GROQ_API_KEY"):
-  os.environ["GROQ_API_KEY"] = getpass.getpass("Enter API key for groq: ")
+
+
+def get_groq_api_key():
+    """
+    GROQ_API_KEY from the environment or .env, prompting for it only when the
+    model is first created rather than when config is imported.
+    """
+    if not os.environ.get("GROQ_API_KEY"):
+        from dotenv import load_dotenv
+        load_dotenv()
+    if not os.environ.get("GROQ_API_KEY"):
+        os.environ["GROQ_API_KEY"] = getpass.getpass("Enter API key for groq: ")
+    return os.environ["GROQ_API_KEY"]
+
 
 # URLs
 # NGROK_URL = "https://7ed5-103-47-74-66.ngrok-free.app"
@@ -10,4 +22,55 @@ if not os.environ.get("GROQ_API_KEY"):
 # Model
 #EMBEDDING_MODEL_NAME = "thenlper/gte-small"
 EMBEDDING_MODEL_NAME = "sentence-transformers/static-retrieval-mrl-en-v1"
+# "chroma" or "numpy" (memory-mapped embedding matrix, see numpy_store.py)
+VECTORSTORE_BACKEND = "chroma"
 CHROMA_PERSIST_DIR = "chroma_db"
+NUMPY_STORE_DIR = "numpy_store"
+NUMPY_STORE_DTYPE = "float32"
+# numpy backend search: MRL truncation (None = full dimension), "none"/"int8"/"binary"
+# coarse index, and candidates reranked at full precision per result
+EMBEDDING_DIM = None
+VECTOR_QUANTIZATION = "none"
+RERANK_FACTOR = 4
+# approximate candidate search for the numpy backend: None (scan every row) or "annoy"
+ANN_INDEX = None
+ANNOY_N_TREES = 50
+ANNOY_SEARCH_K = -1
+VECTORSTORE_DIRS = {"chroma": CHROMA_PERSIST_DIR, "numpy": NUMPY_STORE_DIR}
+VECTORSTORE_MANIFEST = os.path.join(VECTORSTORE_DIRS[VECTORSTORE_BACKEND], "manifest.json")
+EMBEDDING_BATCH_SIZE = 64
+# query embedding service: LRU size, micro-batching window (seconds) and batch cap
+EMBEDDING_CACHE_SIZE = 4096
+EMBEDDING_BATCH_WINDOW = 0.005
+EMBEDDING_MAX_BATCH = 64
+DB_PATH = "ecommerce.db"
+FTS_REWRITE = False
+DB_POOL_SIZE = 4
+DB_CACHE_SIZE_KIB = 32768
+DB_MMAP_SIZE = 268435456
+SQL_CACHE_SIMILARITY = 0.95
+SQL_CACHE_SIZE = 1024
+SQL_CACHE_TTL = 24 * 60 * 60
+SQL_CACHE_PATH = "sql_cache.json"
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_CACHE_TTL = 60 * 60
+PIPELINE_WORKERS = 8
+SPECULATIVE_RETRIEVAL = False
+HYBRID_RETRIEVAL = True
+HYBRID_DENSE_WEIGHT = 0.5
+BM25_INDEX_DIR = "bm25_index"
+# conversation memory: SQLite checkpoints, turns kept per thread, history tokens
+# sent to the model per turn, and idle threads deleted after MEMORY_IDLE_TTL seconds
+MEMORY_DB_PATH = "conversations.sqlite"
+MEMORY_MAX_TURNS = 10
+MEMORY_TOKEN_BUDGET = 2000
+MEMORY_IDLE_TTL = 24 * 60 * 60
+MEMORY_EVICT_INTERVAL = 10 * 60
+# CLI startup: build the DB and vector store in background threads while the
+# prompt already accepts queries, and optionally ping the model once it loads
+BACKGROUND_STARTUP = True
+MODEL_HEALTH_CHECK = False
+# answer prompt data: token budget for SQL rows / retrieved documents, and the
+# longest value rendered per cell
+CONTEXT_TOKEN_BUDGET = 800
+CONTEXT_MAX_CELL_CHARS = 160
@@ -0,0 +1,251 @@
+import logging
+import math
+import re
+import threading
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_MAX_CELL_CHARS
+
+logger = logging.getLogger(__name__)
+
+# columns shown for every question, per dataset
+ANCHOR_COLUMNS = {
+    'order': ['Order_Date', 'Customer_Id', 'Product', 'Quantity', 'Sales'],
+    'product': ['title', 'price', 'average_rating'],
+}
+
+# column -> words of a question that ask for it
+COLUMN_TERMS = {
+    'Order_Date': ['date', 'when', 'day', 'month', 'year', 'recent', 'latest', 'last'],
+    'Time': ['time', 'hour'],
+    'Aging': ['aging', 'delivery', 'deliver', 'delivered', 'days'],
+    'Customer_Id': ['customer id'],
+    'Gender': ['gender', 'male', 'female'],
+    'Device_Type': ['device', 'mobile', 'web', 'app'],
+    'Customer_Login_type': ['login', 'member', 'guest', 'account'],
+    'Product_Category': ['category', 'categories', 'type'],
+    'Product': ['product', 'item', 'bought', 'purchased'],
+    'Quantity': ['quantity', 'how many', 'units'],
+    'Discount': ['discount', 'offer', 'deal'],
+    'Profit': ['profit', 'margin'],
+    'Sales': ['sales', 'spent', 'spend', 'revenue', 'amount', 'total', 'paid'],
+    'Shipping_Cost': ['shipping', 'freight'],
+    'Order_Priority': ['priority', 'urgent', 'critical'],
+    'Payment_method': ['payment', 'pay', 'paid', 'card', 'cash', 'wallet'],
+    'title': ['product', 'name', 'title'],
+    'main_category': ['category', 'categories'],
+    'price': ['price', 'cost', 'cheap', 'cheapest', 'expensive', 'budget', 'under', 'below', 'above'],
+    'average_rating': ['rating', 'rated', 'best', 'top', 'stars'],
+    'rating_number': ['reviews', 'ratings', 'popular'],
+    'features': ['feature', 'features', 'spec', 'specs', 'specification'],
+    'description': ['description', 'describe', 'about'],
+    'store': ['store', 'brand', 'seller', 'sold by'],
+    'categories': ['categories', 'subcategory'],
+    'details': ['details', 'dimensions', 'weight', 'size', 'material'],
+    'parent_asin': ['asin'],
+}
+# every column of each table, a result holding all of them is a SELECT * row
+DATASET_COLUMNS = {
+    'order': ['Order_Date', 'Time', 'Aging', 'Customer_Id', 'Gender', 'Device_Type', 'Customer_Login_type',
+              'Product_Category', 'Product', 'Quantity', 'Discount', 'Profit', 'Sales', 'Shipping_Cost',
+              'Order_Priority', 'Payment_method'],
+    'product': ['title', 'main_category', 'price', 'average_rating', 'rating_number', 'features',
+                'description', 'store', 'categories', 'details', 'parent_asin'],
+}
+COLUMN_PATTERNS = {
+    col: re.compile(r'\b(?:' + '|'.join(re.escape(term) for term in terms) + r')\b')
+    for col, terms in COLUMN_TERMS.items()
+}
+
+DECIMAL = re.compile(r'(?<![\w.])\d+\.\d+(?![\w.])')
+
+# document labels (doc_processor) -> the column they render
+DOCUMENT_LABELS = {
+    'Title': 'title', 'Category': 'main_category', 'Price': 'price', 'Rating': 'average_rating',
+    'Description': 'description', 'Features': 'features', 'Additional Categories': 'categories',
+    'Store': 'store', 'Details': 'details',
+}
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token, the estimate the conversation memory uses
+    return math.ceil(len(text) / 4)
+
+
+def requested_columns(query: str) -> set:
+    """
+    Known columns the question mentions, directly or through COLUMN_TERMS.
+    """
+    query = query.lower()
+    return {col for col, pattern in COLUMN_PATTERNS.items() if pattern.search(query)}
+
+
+def _dataset(columns) -> str:
+    return 'order' if any(col in ANCHOR_COLUMNS['order'] for col in columns) else 'product'
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if value.is_integer() else str(round(value, 2))
+
+
+def _cell(value, max_chars: int) -> str:
+    if isinstance(value, float):
+        return '' if math.isnan(value) else _number(value)
+    text = ' '.join(str(value).split()).replace('|', '/')
+    if text == 'nan':
+        return ''
+    # numbers inside document text, e.g. "Sales: 106.12044592163542"
+    text = DECIMAL.sub(lambda match: _number(float(match.group())), text)
+    return text if len(text) <= max_chars else text[:max_chars - 3] + '...'
+
+
+def _legacy_sql_tokens(df) -> int:
+    # size of the previous format_sql_results output (header, column list and
+    # the first 10 rows as a padded to_string table), estimated from the cell
+    # widths instead of rendering it
+    head = df.head(10)
+    def width(value):
+        return len(f"{value:.6f}") if isinstance(value, float) else len(str(value))
+
+    widths = [max([len(str(col))] + [width(value) for value in head[col]]) for col in df.columns]
+    table = (sum(widths) + 2 * max(len(widths) - 1, 0) + 1) * (len(head) + 1)
+    header = 200 + sum(len(str(col)) + 2 for col in df.columns)
+    return math.ceil((header + table) / 4)
+
+
+def _legacy_document_tokens(docs) -> int:
+    # size of the previous format_retrieved_documents output
+    return math.ceil(sum(len(doc.page_content) + len(str(doc.metadata)) + 24 for doc in docs) / 4)
+
+
+class ContextBuilder:
+    """
+    Assembles the data part of the answer prompt within a token budget.
+
+    Full table rows (SELECT *) keep only the columns the question needs: the
+    dataset's anchor columns and the ones the question mentions. Results of a
+    query that listed its columns keep all of them. Columns with one value
+    across all rows are stated
+    once above the table, empty columns are dropped, and rows are rendered as
+    a compact `|` separated table until the budget is spent. Retrieved
+    documents get the same projection over their `Label: value` lines, their
+    metadata is dropped where the content already carries it, and duplicates
+    are skipped.
+
+    Every call is compared with an estimate of the previous fixed formatting,
+    and the tokens saved are logged and accumulated in stats().
+    """
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET, max_cell_chars: int = CONTEXT_MAX_CELL_CHARS):
+        self.token_budget = token_budget
+        self.max_cell_chars = max_cell_chars
+        self._lock = threading.Lock()
+        self.contexts = 0
+        self.tokens = 0
+        self.baseline_tokens = 0
+
+    def _record(self, kind: str, text: str, baseline_tokens: int, shown: int, total: int):
+        tokens = estimate_tokens(text)
+        with self._lock:
+            self.contexts += 1
+            self.tokens += tokens
+            self.baseline_tokens += baseline_tokens
+        logger.info(f"{kind} context: ~{tokens} tokens, {shown} of {total} shown, "
+                    f"~{baseline_tokens - tokens} tokens saved")
+
+    def _keep(self, columns, query: str, dataset: str) -> list:
+        # only a full table row (SELECT *) is projected; columns the SQL
+        # listed explicitly were chosen for the question and are all kept
+        if not set(DATASET_COLUMNS[dataset]) <= set(columns):
+            return list(columns)
+        requested = requested_columns(query)
+        keep = [col for col in columns if col in ANCHOR_COLUMNS[dataset] or col in requested]
+        return keep or list(columns)
+
+    def sql_context(self, df, query: str) -> str:
+        if df.empty:
+            return "No results found for the given query."
+
+        original = df
+        df = df[self._keep(df.columns, query, _dataset(df.columns))]
+        df = df.loc[:, df.notna().any()]
+
+        # a column with one value for every row is stated once
+        lines = [f"Rows found: {len(df)}"]
+        constant = []
+        if len(df) > 1 and len(df.columns) > 1:
+            constant = [col for col in df.columns if df[col].nunique(dropna=False) == 1]
+            constant = constant if len(constant) < len(df.columns) else []
+            lines += [f"{col} (all rows): {_cell(df[col].iloc[0], self.max_cell_chars)}" for col in constant]
+        table = df.drop(columns=constant)
+        lines.append(" | ".join(table.columns))
+
+        used = estimate_tokens("\n".join(lines))
+        shown = 0
+        for row in table.itertuples(index=False):
+            line = " | ".join(_cell(value, self.max_cell_chars) for value in row)
+            used += estimate_tokens(line) + 1
+            if shown and used > self.token_budget:
+                break
+            lines.append(line)
+            shown += 1
+        if shown < len(table):
+            lines.append(f"(showing {shown} of {len(table)} rows)")
+
+        text = "\n".join(lines)
+        self._record("SQL", text, _legacy_sql_tokens(original), shown, len(table))
+        return text
+
+    def _document_fields(self, doc, requested: set):
+        dataset = doc.metadata.get('dataset_type', 'product')
+        anchors = ANCHOR_COLUMNS.get(dataset, [])
+        fields = []
+        for line in doc.page_content.splitlines():
+            label, sep, value = line.strip().partition(': ')
+            if not sep:
+                # unlabelled text, e.g. the rest of a field split across chunks
+                if label and not label.endswith(':'):
+                    fields.append((None, _cell(label, self.max_cell_chars)))
+                continue
+            if value.strip() in ('', 'nan', '$nan'):
+                continue
+            col = DOCUMENT_LABELS.get(label, label)
+            if col in COLUMN_TERMS and col not in anchors and col not in requested:
+                continue
+            fields.append((label, _cell(value, self.max_cell_chars)))
+        # metadata is added for the columns the rendered fields lack, under the
+        # same projection
+        rendered = {DOCUMENT_LABELS.get(label, label) for label, _ in fields if label}
+        fields += [
+            (key, _cell(value, self.max_cell_chars)) for key, value in doc.metadata.items()
+            if key != 'dataset_type' and key not in rendered
+            and not (key in COLUMN_TERMS and key not in anchors and key not in requested)
+        ]
+        return dataset, fields
+
+    def document_context(self, docs, query: str) -> str:
+        requested = requested_columns(query)
+        lines, seen = [], set()
+        used = 0
+        for doc in docs:
+            dataset, fields = self._document_fields(doc, requested)
+            body = "; ".join(value if label is None else f"{label}: {value}" for label, value in fields if value)
+            if body in seen:
+                continue
+            seen.add(body)
+            line = f"{len(lines) + 1}. [{dataset}] {body}"
+            used += estimate_tokens(line) + 1
+            if lines and used > self.token_budget:
+                break
+            lines.append(line)
+
+        text = "\n".join(lines)
+        self._record("Document", text, _legacy_document_tokens(docs), len(lines), len(docs))
+        return text
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'contexts': self.contexts,
+                'mean_tokens': self.tokens / self.contexts if self.contexts else 0.0,
+                'mean_baseline_tokens': self.baseline_tokens / self.contexts if self.contexts else 0.0,
+                'tokens_saved': self.baseline_tokens - self.tokens,
+            }
@@ -2,18 +2,21 @@ import requests
 import pandas as pd
 #from config import NGROK_URL
 
+ORDER_DATA_PATH = r'C:\Users\ASUS\Desktop\A-FAST-ECOMMERCE-RAG-CHATBOT-FOR-CUSTOMERS\data\Order_Data_Dataset.csv'
+PRODUCT_DATA_PATH = r'C:\Users\ASUS\Desktop\A-FAST-ECOMMERCE-RAG-CHATBOT-FOR-CUSTOMERS\data\Product_Information_Dataset.csv'
+
 def load_data():
     # loading both the provided datasets in form of csv first for testing purposes, 
     # so later it can be used via ngrok's api linkage.
 #   headers = {"ngrok-skip-browser-warning": "true"}
 #   response = requests.get(NGROK_URL, headers=headers)
-    order_df = pd.read_csv(r'C:\Users\ASUS\Desktop\A-FAST-ECOMMERCE-RAG-CHATBOT-FOR-CUSTOMERS\data\Order_Data_Dataset.csv')
-    product_df = pd.read_csv(r'C:\Users\ASUS\Desktop\A-FAST-ECOMMERCE-RAG-CHATBOT-FOR-CUSTOMERS\data\Product_Information_Dataset.csv')
+    order_df = pd.read_csv(ORDER_DATA_PATH)
+    product_df = pd.read_csv(PRODUCT_DATA_PATH)
     return order_df, product_df
 
 #this will tell weather the query is about product dataset or order dataset 
 
-def get_dataset_type(query: str) -> str:
+def dataset_keyword_matches(query: str) -> tuple:
     
     product_keywords = ['product', 'item', 'price', 'inventory', 'stock', 'description', 'specification']
     order_keywords = ['order', 'purchase', 'customer', 'date', 'payment', 'shipping']
@@ -23,4 +26,11 @@ def get_dataset_type(query: str) -> str:
     product_matches = sum(1 for keyword in product_keywords if keyword in query_lower)
     order_matches = sum(1 for keyword in order_keywords if keyword in query_lower)
     
+    return product_matches, order_matches
+
+
+def get_dataset_type(query: str) -> str:
+    
+    product_matches, order_matches = dataset_keyword_matches(query)
+    
     return 'product' if product_matches>order_matches else 'order'
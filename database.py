@@ -0,0 +1,361 @@
+import hashlib
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import pandas as pd
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+from config import DB_PATH, DB_POOL_SIZE, DB_CACHE_SIZE_KIB, DB_MMAP_SIZE, FTS_REWRITE
+from data_loader import load_data, ORDER_DATA_PATH, PRODUCT_DATA_PATH
+from query_analyzer import QueryAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# table -> source csv it is loaded from
+SOURCE_FILES = {
+    'orders': ORDER_DATA_PATH,
+    'products': PRODUCT_DATA_PATH,
+}
+
+# columns the generated SQL filters on most
+INDEXES = {
+    'orders': ['Customer_Id', 'Order_Date', 'Product', 'Product_Category'],
+    'products': ['title', 'main_category'],
+}
+
+# table -> (fts5 shadow table, text columns it indexes)
+FTS_TABLES = {
+    'orders': ('orders_fts', ['Product', 'Product_Category']),
+    'products': ('products_fts', ['title', 'description', 'features', 'categories']),
+}
+
+# schema types sqlite should store as plain text
+TEXT_TYPES = {'DATE', 'TIME', 'TEXT'}
+
+
+def _file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _column_types(df: pd.DataFrame, schema: dict) -> dict:
+    """
+    Declared sqlite type per column, taken from the QueryAnalyzer schema and
+    falling back to the pandas dtype for columns the schema doesn't describe.
+    """
+    types = {}
+    for col in df.columns:
+        if col in schema['columns']:
+            declared = schema['columns'][col].split(' - ')[0].strip().upper()
+            types[col] = 'TEXT' if declared in TEXT_TYPES else declared
+        elif pd.api.types.is_integer_dtype(df[col]):
+            types[col] = 'INTEGER'
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            types[col] = 'REAL'
+        else:
+            types[col] = 'TEXT'
+    return types
+
+
+def _source_changed(conn, table: str, path: str):
+    """
+    Compare the source csv against the fingerprint stored at the last load.
+
+    Size and mtime are checked first; the file is only hashed when they differ,
+    so a `touch` without a content change doesn't trigger a reload.
+    Returns (changed, fingerprint).
+    """
+    stat = os.stat(path)
+    row = conn.execute(
+        "SELECT size, mtime_ns, sha256 FROM _source_files WHERE table_name = ?", (table,)
+    ).fetchone()
+    table_exists = _table_exists(conn, table)
+
+    if row and table_exists and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+        return False, (stat.st_size, stat.st_mtime_ns, row[2])
+
+    sha256 = _file_hash(path)
+    changed = not (row and table_exists and row[2] == sha256)
+    return changed, (stat.st_size, stat.st_mtime_ns, sha256)
+
+
+def _load_table(conn, table: str, df: pd.DataFrame, schema: dict):
+    types = _column_types(df, schema)
+    columns = ', '.join(f'"{col}" {col_type}' for col, col_type in types.items())
+    placeholders = ', '.join('?' for _ in types)
+
+    conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+    conn.execute(f'CREATE TABLE "{table}" ({columns})')
+
+    # plain python values (NaN -> NULL) so sqlite3 can bind them
+    values = df.astype(object).where(df.notna(), None)
+    conn.executemany(
+        f'INSERT INTO "{table}" VALUES ({placeholders})',
+        values.itertuples(index=False, name=None)
+    )
+
+    for col in INDEXES.get(table, []):
+        if col in types:
+            conn.execute(f'CREATE INDEX "idx_{table}_{col}" ON "{table}" ("{col}")')
+
+
+def _table_exists(conn, name: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = ?", (name,)
+    ).fetchone() is not None
+
+
+def _build_fts(conn, table: str):
+    """
+    (Re)create the external content FTS5 index over the text columns of `table`.
+
+    The trigram tokenizer makes MATCH a case-insensitive substring search, the
+    same semantics as LIKE '%term%', but answered from the index.
+    """
+    fts_table, columns = FTS_TABLES[table]
+    conn.execute(f'DROP TABLE IF EXISTS "{fts_table}"')
+    conn.execute(
+        f'CREATE VIRTUAL TABLE "{fts_table}" USING fts5('
+        f'{", ".join(columns)}, content=\'{table}\', content_rowid=\'rowid\', tokenize=\'trigram\')'
+    )
+    conn.execute(f'INSERT INTO "{fts_table}"("{fts_table}") VALUES (\'rebuild\')')
+
+
+def rewrite_like_to_fts(sql_query: str) -> str:
+    """
+    Rewrite simple `column LIKE '%term%'` predicates into FTS5 MATCH lookups.
+
+    Only single table queries are touched, and only for columns covered by that
+    table's FTS index with a plain term (no other wildcards, no ESCAPE clause,
+    at least 3 chars so the trigram index can answer it). Anything else is
+    returned unchanged.
+    """
+    # an ESCAPE clause changes what the pattern matches, leave it to LIKE
+    if re.search(r'\bESCAPE\b', sql_query, flags=re.IGNORECASE):
+        return sql_query
+    # joins, comma joins and derived tables make `rowid` ambiguous
+    if re.search(r'\bJOIN\b|\bFROM\s*\(|\bFROM\s+"?\w+"?(\s+(AS\s+)?\w+)?\s*,', sql_query, flags=re.IGNORECASE):
+        return sql_query
+    tables = {t.lower() for t in re.findall(r'\bFROM\s+"?(\w+)"?', sql_query, flags=re.IGNORECASE)}
+    if len(tables) != 1:
+        return sql_query
+    table = tables.pop()
+    if table not in FTS_TABLES:
+        return sql_query
+    fts_table, columns = FTS_TABLES[table]
+    fts_columns = {col.lower(): col for col in columns}
+
+    def replace(match):
+        negated, column, term = match.group(1), match.group(2), match.group(3)
+        if negated or column.lower() not in fts_columns or len(term) < 3:
+            return match.group(0)
+        phrase = term.replace('"', '""')
+        return (
+            f"rowid IN (SELECT rowid FROM {fts_table} "
+            f"WHERE {fts_table} MATCH '{fts_columns[column.lower()]} : \"{phrase}\"')"
+        )
+
+    return re.sub(
+        r'(?<![\w.])(NOT\s+)?"?(\w+)"?\s+LIKE\s+\'%([^%_\']+)%\'',
+        replace,
+        sql_query,
+        flags=re.IGNORECASE
+    )
+
+
+def setup_database(db_path: str = DB_PATH):
+    """
+    Open the SQLite database, (re)loading a table only when its source csv changed.
+
+    Tables are created with explicit column types, bulk loaded with executemany,
+    indexed on the most filtered columns and mirrored into FTS5 shadow tables.
+    The database runs in WAL mode so readers don't block on each other or on a
+    reload.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS _source_files (
+            table_name TEXT PRIMARY KEY,
+            path TEXT,
+            size INTEGER,
+            mtime_ns INTEGER,
+            sha256 TEXT
+        )"""
+    )
+    conn.commit()
+
+    fingerprints = {}
+    stale = []
+    for table, path in SOURCE_FILES.items():
+        changed, fingerprints[table] = _source_changed(conn, table, path)
+        if changed:
+            stale.append(table)
+
+    if stale:
+        order_df, product_df = load_data()
+        analyzer = QueryAnalyzer()
+        sources = {
+            'orders': (order_df, analyzer.order_schema),
+            'products': (product_df, analyzer.product_schema),
+        }
+        conn.execute("BEGIN")
+        try:
+            for table in stale:
+                df, schema = sources[table]
+                # the fts index references the table, drop it before the reload
+                conn.execute(f'DROP TABLE IF EXISTS "{FTS_TABLES[table][0]}"')
+                _load_table(conn, table, df, schema)
+                logger.info(f"Loaded {len(df)} rows into {table}")
+        except Exception:
+            conn.rollback()
+            raise
+    else:
+        conn.execute("BEGIN")
+
+    for table, (fts_table, _) in FTS_TABLES.items():
+        if table in stale or not _table_exists(conn, fts_table):
+            _build_fts(conn, table)
+            logger.info(f"Built full-text index {fts_table}")
+
+    # stat info is refreshed even when only mtime moved
+    conn.executemany(
+        "INSERT OR REPLACE INTO _source_files VALUES (?, ?, ?, ?, ?)",
+        [(table, SOURCE_FILES[table], *fingerprints[table]) for table in SOURCE_FILES]
+    )
+    conn.commit()
+
+    if stale:
+        conn.execute("ANALYZE")
+        logger.info(f"Database rebuilt for changed sources: {', '.join(stale)}")
+    else:
+        logger.info("Database is up to date with the source files, skipping reload")
+
+    return conn
+
+
+def _read_sql(pool, sql_query: str, params=None) -> pd.DataFrame:
+    with pool.connection() as conn:
+        return pd.read_sql_query(sql_query, conn, params=params)
+
+
+def execute_sql_query(pool, sql_query: str, params=None) -> pd.DataFrame:
+    try:
+        result_df = None
+        if FTS_REWRITE:
+            fts_query = rewrite_like_to_fts(sql_query)
+            if fts_query != sql_query:
+                logger.info(f"Rewrote LIKE predicates to full-text search: {fts_query}")
+                try:
+                    result_df = _read_sql(pool, fts_query, params)
+                except Exception as e:
+                    # a MATCH expression fts5 can't parse, the LIKE form still answers
+                    logger.warning(f"Full-text query failed ({e}), falling back to the original LIKE query")
+        if result_df is None:
+            result_df = _read_sql(pool, sql_query, params)
+        logger.info(f"SQL query executed successfully, returned {len(result_df)} rows")
+        return result_df
+    except Exception as e:
+        logger.error(f"Error executing SQL query: {e}")
+        return pd.DataFrame()
+
+
+def get_data_version(pool) -> str:
+    """
+    Fingerprint of the loaded source files; changes whenever setup_database
+    reloads a table.
+    """
+    with pool.connection() as conn:
+        rows = conn.execute("SELECT sha256 FROM _source_files ORDER BY table_name").fetchall()
+    return hashlib.sha256(",".join(row[0] for row in rows).encode("utf-8")).hexdigest()
+
+
+def get_main_categories(pool) -> list:
+    """
+    Distinct product main categories, used to recognise categories named in a query.
+    """
+    with pool.connection() as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT main_category FROM products WHERE main_category IS NOT NULL"
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of read-only connections to the SQLite database.
+
+    Connections are opened once with `mode=ro`, `check_same_thread=False` and a
+    larger page cache / mmap window, then handed out to whichever thread asks,
+    so queries don't pay connection setup or a cold cache every time. Time spent
+    waiting for a free connection and time spent holding it are recorded.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, size: int = DB_POOL_SIZE,
+                 cache_size_kib: int = DB_CACHE_SIZE_KIB, mmap_size: int = DB_MMAP_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self._pool = queue.Queue(maxsize=size)
+        self._lock = threading.Lock()
+        self._queries = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._query_seconds = 0.0
+        self._max_query_seconds = 0.0
+        for _ in range(size):
+            self._pool.put(self._connect())
+
+    def _connect(self):
+        uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA cache_size=-{self.cache_size_kib}")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        start = perf_counter()
+        conn = self._pool.get()
+        acquired = perf_counter()
+        try:
+            yield conn
+        finally:
+            released = perf_counter()
+            self._pool.put(conn)
+            wait, held = acquired - start, released - acquired
+            with self._lock:
+                self._queries += 1
+                self._wait_seconds += wait
+                self._max_wait_seconds = max(self._max_wait_seconds, wait)
+                self._query_seconds += held
+                self._max_query_seconds = max(self._max_query_seconds, held)
+
+    def stats(self) -> dict:
+        with self._lock:
+            queries = self._queries
+            return {
+                'pool_size': self.size,
+                'idle_connections': self._pool.qsize(),
+                'queries': queries,
+                'avg_wait_ms': 1000 * self._wait_seconds / queries if queries else 0.0,
+                'max_wait_ms': 1000 * self._max_wait_seconds,
+                'avg_query_ms': 1000 * self._query_seconds / queries if queries else 0.0,
+                'max_query_ms': 1000 * self._max_query_seconds,
+            }
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
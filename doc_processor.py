@@ -1,92 +1,128 @@
 from langchain.schema import Document
 import pandas as pd
 
-def create_documents(dataframes):
+# rows rendered per vectorized step, bounds memory while documents are streamed
+DOC_BATCH_SIZE = 5000
+
+ORDER_FIELDS = [
+    'Order_Date', 'Time', 'Aging', 'Customer_Id', 'Gender', 'Device_Type',
+    'Customer_Login_type', 'Product_Category', 'Product', 'Quantity', 'Discount',
+    'Profit', 'Sales', 'Shipping_Cost', 'Order_Priority', 'Payment_method'
+]
+ORDER_METADATA = ['Order_Date', 'Time', 'Customer_Id', 'Product', 'Product_Category']
+PRODUCT_METADATA = ['title', 'main_category', 'price', 'average_rating', 'rating_number']
+
+# matches the indentation of the original per-row f-string template
+ORDER_INDENT = "\n" + " " * 16
+
+
+def _as_text(column):
+    # str() of every cell, NaN included, same as formatting the row values one by one
+    return column.map(str)
+
+
+def _optional_field(column, label, max_len=None):
     """
-    Create documents from both order and product dataframes.
+    Render `label: value` for every row of `column`, or '' where the value is
+    missing (or longer than `max_len`).
+    """
+    text = _as_text(column)
+    keep = column.notna() & (text != 'nan')
+    if max_len is not None:
+        keep &= text.str.len() < max_len
+    return (label + text + "\n").where(keep, "")
+
+
+def _metadata_records(df, columns, dataset_type):
+    values = [_as_text(df[col]).tolist() for col in columns]
+    return [
+        dict(zip(columns, row), dataset_type=dataset_type)
+        for row in zip(*values)
+    ]
+
+
+def _order_batch(order_df):
+    content = pd.Series("", index=order_df.index)
+    for col in ORDER_FIELDS:
+        content = content + ORDER_INDENT + col + ": " + _as_text(order_df[col])
+    content = content + ORDER_INDENT
+
+    metadatas = _metadata_records(order_df, ORDER_METADATA, 'order')
+    return [
+        Document(page_content=text, metadata=metadata)
+        for text, metadata in zip(content.tolist(), metadatas)
+    ]
+
+
+#main_category,title,average_rating,rating_number,features,description,price,store,categories,details,parent_asin
+
+def _product_batch(product_df):
+    # Create more comprehensive content for better searchability
+    content = (
+        "Product Information:\n"
+        + "Title: " + _as_text(product_df['title']) + "\n"
+        + "Category: " + _as_text(product_df['main_category']) + "\n"
+        + "Price: $" + _as_text(product_df['price']) + "\n"
+        + "Rating: " + _as_text(product_df['average_rating'])
+        + " (" + _as_text(product_df['rating_number']) + " ratings)\n"
+        + _optional_field(product_df['description'], "Description: ", max_len=500)
+        + _optional_field(product_df['features'], "Features: ", max_len=500)
+        + _optional_field(product_df['categories'], "Additional Categories: ")
+        + _optional_field(product_df['store'], "Store: ")
+        + _optional_field(product_df['details'], "Details: ", max_len=500)
+    )
+
+    metadatas = _metadata_records(product_df, PRODUCT_METADATA, 'product')
+    return [
+        Document(page_content=text, metadata=metadata)
+        for text, metadata in zip(content.tolist(), metadatas)
+    ]
+
+
+def iter_document_batches(dataframes, batch_size=DOC_BATCH_SIZE):
+    """
+    Lazily build documents from both order and product dataframes.
+
+    Each batch of `batch_size` rows is rendered with column-wise string operations
+    and yielded as a list, so consumers can split and embed while later batches
+    have not been built yet.
     
     Args:
         dataframes (tuple): A tuple containing (order_df, product_df)
+        batch_size (int): Number of rows rendered per batch
         
-    Returns:
-        list: List of Document objects for both datasets
+    Yields:
+        list: Document objects for one batch of rows
     """
     order_df, product_df = dataframes
-    docs = []
-    
-    # Process order data
-    for _, row in order_df.iterrows():
-        metadata = {
-            'Order_Date': str(row['Order_Date']),
-            'Time': str(row['Time']),
-            'Customer_Id': str(row['Customer_Id']),
-            'Product': str(row['Product']),
-            'Product_Category': str(row['Product_Category']),
-            'dataset_type': 'order'  # Add dataset type to metadata
-        }
-        
-        content = f"""
-                Order_Date: {row['Order_Date']}
-                Time: {row['Time']}
-                Aging: {row['Aging']}
-                Customer_Id: {row['Customer_Id']}
-                Gender: {row['Gender']}
-                Device_Type: {row['Device_Type']}
-                Customer_Login_type: {row['Customer_Login_type']}
-                Product_Category: {row['Product_Category']}
-                Product: {row['Product']}
-                Quantity: {row['Quantity']}
-                Discount: {row['Discount']}
-                Profit: {row['Profit']}
-                Sales: {row['Sales']}
-                Shipping_Cost: {row['Shipping_Cost']}
-                Order_Priority: {row['Order_Priority']}
-                Payment_method: {row['Payment_method']}
-                """
-        
-        docs.append(Document(page_content=content, metadata=metadata))
 
-#main_category,title,average_rating,rating_number,features,description,price,store,categories,details,parent_asin
+    for start in range(0, len(order_df), batch_size):
+        yield _order_batch(order_df.iloc[start:start + batch_size])
 
-    # Process product data
-    for _, row in product_df.iterrows():
-        metadata = {
-            'title': str(row['title']),
-            'main_category': str(row['main_category']),
-            'price': str(row['price']),
-            'average_rating': str(row['average_rating']),
-            'rating_number': str(row['rating_number']),
-            'dataset_type': 'product'
-        }
-        
-        # Create more comprehensive content for better searchability
-        content = f"Product Information:\n"
-        content += f"Title: {row['title']}\n"
-        content += f"Category: {row['main_category']}\n"
-        content += f"Price: ${row['price']}\n"
-        content += f"Rating: {row['average_rating']} ({row['rating_number']} ratings)\n"
-        
-        #description if available and not too long
-        if pd.notna(row['description']) and len(str(row['description'])) < 500:
-            content += f"Description: {row['description']}\n"
-        
-        #features if available and not too long
-        if pd.notna(row['features']) and len(str(row['features'])) < 500:
-            content += f"Features: {row['features']}\n"
-        
-        #additional categories if available
-        if pd.notna(row['categories']) and str(row['categories']) != 'nan':
-            content += f"Additional Categories: {row['categories']}\n"
+    for start in range(0, len(product_df), batch_size):
+        yield _product_batch(product_df.iloc[start:start + batch_size])
 
-        #store information if available
-        if pd.notna(row['store']) and str(row['store']) != 'nan':
-            content += f"Store: {row['store']}\n"
-        
-        #etails if available and not too long
-        if pd.notna(row['details']) and len(str(row['details'])) < 500:
-            content += f"Details: {row['details']}\n"
+
+def iter_documents(dataframes, batch_size=DOC_BATCH_SIZE):
+    """
+    Generator over the documents of `iter_document_batches`, one at a time.
+    """
+    for batch in iter_document_batches(dataframes, batch_size):
+        yield from batch
+
+
+def create_documents(dataframes):
+    """
+    Create documents from both order and product dataframes.
+    
+    Args:
+        dataframes (tuple): A tuple containing (order_df, product_df)
         
-        docs.append(Document(page_content=content, metadata=metadata))
+    Returns:
+        list: List of Document objects for both datasets
+    """
+    order_df, product_df = dataframes
+    docs = list(iter_documents(dataframes))
     
     print(f"Created {len(docs)} documents ({len(order_df)} orders, {len(product_df)} products)")
     
@@ -0,0 +1,150 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from time import perf_counter
+from typing import List
+import numpy as np
+import torch
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+from caching import LRUCache
+from config import EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_SIZE, EMBEDDING_BATCH_WINDOW, EMBEDDING_MAX_BATCH
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingService(Embeddings):
+    """
+    Shared front of the embedding model for every session and thread.
+
+    `embed_query` answers repeated queries from an LRU cache of float32
+    vectors. Misses are queued for one background thread, which waits up to
+    `batch_window` seconds for more queries (at most `max_batch`) and embeds
+    them all in a single `embed_documents` call, so concurrent users share one
+    forward pass.
+    `embed_documents` (the bulk path used when building the vector store) goes
+    straight to the model.
+
+    Queries are embedded with the model's document encoding, which is the same
+    for models without query prompts such as EMBEDDING_MODEL_NAME.
+    """
+
+    def __init__(self, model: Embeddings, cache_size: int = EMBEDDING_CACHE_SIZE,
+                 batch_window: float = EMBEDDING_BATCH_WINDOW, max_batch: int = EMBEDDING_MAX_BATCH):
+        self.model = model
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._cache = LRUCache(cache_size)
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.cache_hits = 0
+        self.batches = 0
+        self.batched_queries = 0
+        self.max_batch_seen = 0
+        self.queue_wait = 0.0
+        self.max_queue_wait = 0.0
+
+    def _ensure_worker(self):
+        with self._lock:
+            # restarted if it ever died, queued futures would otherwise wait forever
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = perf_counter() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._embed_batch(batch)
+
+    def _embed_batch(self, batch):
+        # every failure goes to the waiting futures instead of killing the worker
+        try:
+            self._embed(batch)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _embed(self, batch):
+        started = perf_counter()
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        embedded = self.model.embed_documents(texts)
+        if len(embedded) != len(texts):
+            raise ValueError(f"Embedding model returned {len(embedded)} vectors for {len(texts)} texts")
+        # float32 arrays take a quarter of the memory of python float lists in the cache
+        vectors = dict(zip(texts, np.asarray(embedded, dtype=np.float32)))
+
+        waits = [started - enqueued_at for _, _, enqueued_at in batch]
+        with self._lock:
+            self.batches += 1
+            self.batched_queries += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self.queue_wait += sum(waits)
+            self.max_queue_wait = max(self.max_queue_wait, max(waits))
+        for text, vector in vectors.items():
+            self._cache.put(text, vector)
+        for text, future, _ in batch:
+            future.set_result(vectors[text])
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._cache.get(text)
+        with self._lock:
+            self.requests += 1
+            if vector is not None:
+                self.cache_hits += 1
+        if vector is not None:
+            return vector.tolist()
+
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future, perf_counter()))
+        return future.result().tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'cache_hits': self.cache_hits,
+                'hit_rate': self.cache_hits / self.requests if self.requests else 0.0,
+                'cache_size': len(self._cache),
+                'batches': self.batches,
+                'mean_batch_size': self.batched_queries / self.batches if self.batches else 0.0,
+                'max_batch_size': self.max_batch_seen,
+                'mean_queue_wait_ms': 1000 * self.queue_wait / self.batched_queries if self.batched_queries else 0.0,
+                'max_queue_wait_ms': 1000 * self.max_queue_wait,
+            }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """
+    The process-wide EmbeddingService, loading the model on first use.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            logger.info("Initializing embedding model...")
+            model = HuggingFaceEmbeddings(
+                model_name=EMBEDDING_MODEL_NAME,
+                model_kwargs={"device": "cuda" if torch.cuda.is_available() else "cpu"}
+            )
+            _service = EmbeddingService(model)
+        return _service
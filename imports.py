@@ -1,16 +1,11 @@
+# Only light modules are imported here; langchain, langgraph, torch, chroma
+# and pandas are imported by the startup phases and the query path on first use
 from dotenv import load_dotenv
 import os
-from doc_processor import create_documents
-from vectorstore_builder import build_vectorstore
-from model_config import setup_model, test_model, setup_workflow
-from query_analyzer import QueryAnalyzer
-from langchain.retrievers import EnsembleRetriever
-from langchain_community.retrievers import BM25Retriever
+from config import SPECULATIVE_RETRIEVAL, BACKGROUND_STARTUP, get_groq_api_key
+from startup import BackgroundStartup, StartupReport
+from context_builder import ContextBuilder
 import logging
 import sys
-from data_loader import load_data, get_dataset_type
+import uuid
 from time import time
-from langchain_core.messages import HumanMessage
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-import sqlite3
\ No newline at end of file
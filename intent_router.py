@@ -0,0 +1,104 @@
+import re
+from typing import Dict, Any, Optional
+
+# Parameterized SQL for the high frequency intents. The statements never change,
+# so sqlite compiles each one once per pooled connection and reuses it from the
+# connection's statement cache afterwards.
+CUSTOMER_ORDERS_SQL = (
+    "SELECT * FROM orders WHERE Customer_Id = ? "
+    "ORDER BY Order_Date DESC, Time DESC LIMIT 50;"
+)
+PRODUCT_DETAILS_SQL = (
+    "SELECT title, main_category, price, average_rating, rating_number, store "
+    "FROM products WHERE title LIKE ? ORDER BY rating_number DESC LIMIT 50;"
+)
+CATEGORY_SALES_SQL = (
+    "SELECT Product_Category, COUNT(*) AS orders, ROUND(SUM(Sales), 2) AS total_sales, "
+    "ROUND(SUM(Profit), 2) AS total_profit FROM orders "
+    "WHERE Product_Category LIKE ? AND strftime('%Y', Order_Date) = ? "
+    "GROUP BY Product_Category;"
+)
+
+CUSTOMER_ID_RE = re.compile(
+    r'\bcustomer(?:[\s_-]*id)?\s*(?:#|no\.?|number)?\s*[:=]?\s*(\d+)\b', re.IGNORECASE
+)
+
+# Templates answer only queries they understand completely: every pattern must
+# match the whole query, so any extra constraint (a year, a payment method, a
+# price bound, a count) leaves it unmatched and the LLM writes the SQL.
+_LEAD = (
+    r'(?:(?:please\s+)?(?:show|list|get|give|display|find|fetch|tell)\s+(?:me\s+)?'
+    r'|(?:what|which)\s+(?:is|are|was|were)\s+|what\'s\s+)?(?:the\s+|all\s+)?'
+)
+_CUSTOMER = r'customer(?:[\s_-]*id)?\s*(?:#|no\.?|number)?\s*[:=]?\s*\d+'
+_HISTORY = r'(?:(?:recent|past|previous)\s+)?(?:orders|purchases|order\s+history|purchase\s+history)'
+_END = r'\s*[?.!]*'
+CUSTOMER_ORDERS_RE = re.compile(
+    rf'(?:{_LEAD}{_HISTORY}\s+(?:of|for|by|from|placed\s+by|made\s+by)\s+{_CUSTOMER}'
+    rf'|{_LEAD}{_CUSTOMER}(?:\'s)?\s+{_HISTORY}'
+    rf'|what\s+(?:did|has)\s+{_CUSTOMER}\s+(?:buy|bought|order|ordered|purchase|purchased))'
+    rf'{_END}',
+    re.IGNORECASE
+)
+PRODUCT_DETAILS_RE = re.compile(
+    rf'{_LEAD}(?:price|cost|rating|ratings|reviews?)\s+(?:of|for)\s+(?:the\s+|a\s+|an\s+)?'
+    rf'["\']?(?P<product>[^"\'?]+?)["\']?{_END}',
+    re.IGNORECASE
+)
+CATEGORY_SALES_RE = re.compile(
+    rf'{_LEAD}(?:total\s+)?(?:sales|revenue|profit)\s+(?:in|for|of)\s+(?:the\s+)?["\']?(?P<category>[^"\']+?)["\']?'
+    rf'(?:\s+category)?\s+(?:in|for|during)\s+(?:the\s+year\s+)?(?P<year>(?:19|20)\d{{2}}){_END}',
+    re.IGNORECASE
+)
+# a product or category slot holding any of these is a constraint the template
+# cannot express (superlatives, aggregates, filters, other entities, bare numbers
+# such as years or amounts; model numbers like BY-M1 are fine)
+SLOT_REJECT_RE = re.compile(
+    r'\b(?:each|every|per|all|any|average|avg|mean|median|cheapest|expensive|most|least|highest|lowest'
+    r'|best|worst|top|bottom|max(?:imum)?|min(?:imum)?|how|many|much|count|number|total|sum|compare|versus|vs'
+    r'|than|between|under|over|above|below|less|more|with|without|and|or|not|by|from|in|customers?|products?'
+    r'|items?|orders?|categor(?:y|ies)|year|month|week|day|date|card|credit|debit|cash|upi|wallet|payment|paid'
+    r'|pay|cod)\b|\b\d+(?:\.\d+)?\b|\$',
+    re.IGNORECASE
+)
+
+
+def extract_customer_id(query: str) -> Optional[int]:
+    match = CUSTOMER_ID_RE.search(query)
+    return int(match.group(1)) if match else None
+
+
+def _result(intent: str, sql_query: str, params: tuple, table_name: str) -> Dict[str, Any]:
+    return {
+        'sql_query': sql_query,
+        'params': params,
+        'table_name': table_name,
+        'dataset_type': 'product' if table_name == 'products' else 'order',
+        'intent': intent
+    }
+
+
+def match_intent(query: str) -> Optional[Dict[str, Any]]:
+    """
+    Map a query to one of the parameterized templates without calling the LLM.
+
+    Returns a result shaped like QueryAnalyzer.generate_sql_query (plus 'params'
+    and 'intent') or None when the query needs the LLM.
+    """
+    query = query.strip()
+
+    match = CATEGORY_SALES_RE.fullmatch(query)
+    if match and not SLOT_REJECT_RE.search(match.group('category')):
+        category = match.group('category').strip()
+        return _result('category_sales', CATEGORY_SALES_SQL, (f"%{category}%", match.group('year')), 'orders')
+
+    if CUSTOMER_ORDERS_RE.fullmatch(query):
+        return _result('customer_orders', CUSTOMER_ORDERS_SQL, (extract_customer_id(query),), 'orders')
+
+    match = PRODUCT_DETAILS_RE.fullmatch(query)
+    if match and not SLOT_REJECT_RE.search(match.group('product')):
+        product = match.group('product').strip()
+        if len(product) >= 3:
+            return _result('product_details', PRODUCT_DETAILS_SQL, (f"%{product}%",), 'products')
+
+    return None
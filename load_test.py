@@ -0,0 +1,133 @@
+"""
+Load test for the async chat pipeline with a local stub LLM.
+
+    python load_test.py --requests 500 --concurrency 50 --llm-latency 0.3
+    python load_test.py --url http://127.0.0.1:8001 --requests 500 --concurrency 50
+
+Without --url the pipeline runs in process against ecommerce.db, with every
+Groq call replaced by a stub that sleeps for --llm-latency seconds, so the
+numbers measure the pipeline's own concurrency rather than the API. With --url
+requests go to a running chat_api server instead.
+"""
+import argparse
+import asyncio
+import itertools
+import statistics
+from time import perf_counter, sleep
+from langchain_core.messages import AIMessage
+
+QUERIES = [
+    "Show me the orders for customer 37077",
+    "What is the price of BOYA BYM1 Microphone?",
+    "What were the total sales in Fashion category in 2018?",
+    "Which products in the Auto & Accessories category were ordered with critical priority?",
+    "List products with an average rating above 4.5",
+    "How many orders were paid by credit card in 2018?",
+]
+
+STUB_SQL = "SELECT title, price, average_rating FROM products WHERE average_rating > 4.5 LIMIT 50;"
+
+
+class StubLLM:
+    """
+    Stands in for ChatGroq: waits `latency` seconds, then answers with canned
+    SQL for the SQL generation prompt and a short text for everything else.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def _reply(self, prompt):
+        text = prompt if isinstance(prompt, str) else str(prompt[-1].content)
+        return AIMessage(content=STUB_SQL if "SQL query generator" in text else "Stub answer.")
+
+    def invoke(self, prompt, config=None):
+        sleep(self.latency)
+        return self._reply(prompt)
+
+    async def ainvoke(self, prompt, config=None):
+        await asyncio.sleep(self.latency)
+        return self._reply(prompt)
+
+
+async def build_local_pipeline(llm_latency: float):
+    from database import setup_database, ConnectionPool
+    from memory import ConversationMemory
+    from model_config import setup_workflow
+    from pipeline import ChatPipeline
+    from query_analyzer import QueryAnalyzer
+
+    setup_database().close()
+    llm = StubLLM(llm_latency)
+    # throwaway conversations, kept out of the real conversation store
+    memory = await ConversationMemory.aopen(path=":memory:")
+    pipeline = ChatPipeline(
+        query_analyzer=QueryAnalyzer(llm=llm),
+        workflow=setup_workflow(llm, memory),
+        pool=ConnectionPool()
+    )
+    return pipeline, memory
+
+
+async def run(args):
+    queries = itertools.cycle(QUERIES)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    errors = 0
+
+    if args.url:
+        import httpx
+        client = httpx.AsyncClient(base_url=args.url, timeout=None)
+
+        async def call(query, thread_id):
+            response = await client.post("/chat", json={"query": query, "thread_id": thread_id})
+            response.raise_for_status()
+    else:
+        pipeline, memory = await build_local_pipeline(args.llm_latency)
+
+        async def call(query, thread_id):
+            await pipeline.answer(query, thread_id)
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = perf_counter()
+            try:
+                await call(next(queries), f"load-{i}")
+            except Exception:
+                errors += 1
+                return
+            latencies.append(perf_counter() - start)
+
+    start = perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = perf_counter() - start
+
+    if args.url:
+        await client.aclose()
+    else:
+        pipeline.close()
+        await memory.aclose()
+
+    if not latencies:
+        print(f"All {errors} requests failed")
+        return
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    print(f"requests:    {len(latencies)} ok, {errors} failed")
+    print(f"concurrency: {args.concurrency}")
+    print(f"throughput:  {len(latencies) / elapsed:.1f} req/s over {elapsed:.2f}s")
+    print(f"latency p50: {1000 * percentiles[49]:.1f} ms")
+    print(f"latency p99: {1000 * percentiles[98]:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub LLM delay in seconds")
+    parser.add_argument("--url", help="base url of a running chat_api server")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+from time import time
+from typing import List
+from langchain_core.messages import BaseMessage, HumanMessage, RemoveMessage
+from langchain_core.messages.utils import count_tokens_approximately, trim_messages
+from langgraph.checkpoint.sqlite import SqliteSaver
+from config import MEMORY_DB_PATH, MEMORY_MAX_TURNS, MEMORY_TOKEN_BUDGET, MEMORY_IDLE_TTL, MEMORY_EVICT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+def turn_message(prompt: str, question: str) -> HumanMessage:
+    """
+    The human message of one turn: the full prompt for the model, carrying the
+    bare question it is compacted to once answered.
+    """
+    return HumanMessage(content=prompt, additional_kwargs={"question": question})
+
+
+def compact_message(message: BaseMessage) -> BaseMessage:
+    """
+    The stored form of a turn message: only the user's question, without the
+    SQL rows or retrieved documents of the prompt. Keeps the id, so returning
+    it from a node replaces the prompt in the thread.
+    """
+    question = message.additional_kwargs.get("question")
+    if question is None:
+        return message
+    return HumanMessage(content=question, id=message.id)
+
+
+_PRUNE_CHECKPOINTS = (
+    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+)
+
+
+def _latest(config) -> tuple:
+    configurable = config["configurable"]
+    return str(configurable["thread_id"]), configurable["checkpoint_ns"], configurable["checkpoint_id"]
+
+
+class LatestCheckpointSaver(SqliteSaver):
+    """
+    SqliteSaver keeping only the latest checkpoint of each thread. Older
+    checkpoints (and their pending writes) are deleted as each new one is
+    saved, so a thread takes one row however many turns it has, and the raw
+    prompts of the steps before the compacting model node do not outlive the turn.
+    """
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        with self.cursor() as cur:
+            for statement in _PRUNE_CHECKPOINTS:
+                cur.execute(statement, _latest(saved))
+        return saved
+
+
+def _async_latest_checkpoint_saver(conn):
+    # imported here, the async saver needs aiosqlite only for ainvoke
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    class AsyncLatestCheckpointSaver(AsyncSqliteSaver):
+        """
+        AsyncSqliteSaver keeping only the latest checkpoint of each thread,
+        like LatestCheckpointSaver.
+        """
+
+        async def aput(self, config, checkpoint, metadata, new_versions):
+            saved = await super().aput(config, checkpoint, metadata, new_versions)
+            async with self.lock:
+                for statement in _PRUNE_CHECKPOINTS:
+                    await self.conn.execute(statement, _latest(saved))
+                await self.conn.commit()
+            return saved
+
+    return AsyncLatestCheckpointSaver(conn)
+
+
+class ConversationMemory:
+    """
+    Bounded, persistent conversation memory for the answer workflow.
+
+    Threads are checkpointed to SQLite at `path`, keeping only the latest
+    checkpoint of each thread. After each turn the prompt
+    is compacted to the user's question, so only questions and answers are
+    stored, and turns beyond `max_turns` are removed from the thread. The
+    model sees the most recent turns that fit in `token_budget` tokens plus the
+    current prompt. Threads idle for `idle_ttl` seconds are deleted, checked at
+    most every `evict_interval` seconds.
+    """
+
+    def __init__(self, path: str = MEMORY_DB_PATH, max_turns: int = MEMORY_MAX_TURNS,
+                 token_budget: int = MEMORY_TOKEN_BUDGET, idle_ttl: float = MEMORY_IDLE_TTL,
+                 evict_interval: float = MEMORY_EVICT_INTERVAL, checkpointer=None):
+        self.path = path
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.idle_ttl = idle_ttl
+        self.evict_interval = evict_interval
+        # check_same_thread=False is fine, the saver serializes access with a lock
+        self.checkpointer = checkpointer or LatestCheckpointSaver(sqlite3.connect(path, check_same_thread=False))
+        # last activity per thread, kept next to the checkpoints
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._next_eviction = 0.0
+        self.turns = 0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.last_prompt_tokens = 0
+        self.history_tokens = 0
+        self.trimmed_messages = 0
+        self.compacted_tokens = 0
+        self.evicted_threads = 0
+
+    @classmethod
+    async def aopen(cls, path: str = MEMORY_DB_PATH, **kwargs):
+        """
+        Memory for a workflow run with ainvoke, on the async SQLite saver
+        (SqliteSaver has no async interface). Call from the event loop.
+        """
+        import aiosqlite
+
+        return cls(path, checkpointer=_async_latest_checkpoint_saver(await aiosqlite.connect(path)), **kwargs)
+
+    def context(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """
+        Messages for the model: the latest earlier turns within the token
+        budget, then the current prompt.
+        """
+        history = trim_messages(
+            messages[:-1], max_tokens=self.token_budget, token_counter=count_tokens_approximately,
+            strategy="last", start_on="human"
+        )
+        with self._lock:
+            self.trimmed_messages += len(messages) - 1 - len(history)
+            self.history_tokens += count_tokens_approximately(history)
+        return history + messages[-1:]
+
+    def record_prompt(self, messages: List[BaseMessage]):
+        tokens = count_tokens_approximately(messages)
+        with self._lock:
+            self.turns += 1
+            self.prompt_tokens += tokens
+            self.last_prompt_tokens = tokens
+            self.max_prompt_tokens = max(self.max_prompt_tokens, tokens)
+        logger.info(f"Prompt size: ~{tokens} tokens over {len(messages)} messages")
+
+    def updates(self, messages: List[BaseMessage], response: BaseMessage) -> List[BaseMessage]:
+        """
+        State updates for a finished turn: the prompt replaced by its question,
+        the answer appended and the oldest turns past the window removed.
+        """
+        prompt = messages[-1]
+        compacted = compact_message(prompt)
+        with self._lock:
+            self.compacted_tokens += (count_tokens_approximately([prompt])
+                                      - count_tokens_approximately([compacted]))
+        # turns are always stored as (question, answer) pairs, so this drops whole turns
+        excess = len(messages) + 1 - 2 * self.max_turns
+        removed = [RemoveMessage(id=message.id) for message in messages[:max(excess, 0)]]
+        return removed + [compacted, response]
+
+    def touch(self, thread_id: str) -> List[str]:
+        """
+        Mark `thread_id` as active. Returns the threads idle for longer than
+        idle_ttl when an eviction check is due, else an empty list.
+        """
+        now = time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO thread_activity VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET last_seen = excluded.last_seen",
+                (str(thread_id), now)
+            )
+            if now < self._next_eviction:
+                return []
+            self._next_eviction = now + self.evict_interval
+            rows = self._conn.execute(
+                "SELECT thread_id FROM thread_activity WHERE last_seen < ?", (now - self.idle_ttl,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    async def atouch(self, thread_id: str) -> List[str]:
+        # the activity table is written from a worker thread: a blocking write on
+        # the event loop would wait on the async saver's lock while stopping the
+        # loop that has to release it
+        return await asyncio.to_thread(self.touch, thread_id)
+
+    def _forget(self, thread_ids: List[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM thread_activity WHERE thread_id = ?", [(t,) for t in thread_ids])
+            self.evicted_threads += len(thread_ids)
+        logger.info(f"Evicted {len(thread_ids)} idle conversation threads")
+
+    def delete_threads(self, thread_ids: List[str]):
+        if not thread_ids:
+            return
+        for thread_id in thread_ids:
+            self.checkpointer.delete_thread(thread_id)
+        self._forget(thread_ids)
+
+    async def adelete_threads(self, thread_ids: List[str]):
+        if not thread_ids:
+            return
+        for thread_id in thread_ids:
+            await self.checkpointer.adelete_thread(thread_id)
+        await asyncio.to_thread(self._forget, thread_ids)
+
+    def stats(self) -> dict:
+        with self._lock:
+            threads = self._conn.execute("SELECT COUNT(*) FROM thread_activity").fetchone()[0]
+            return {
+                'threads': threads,
+                'turns': self.turns,
+                'mean_prompt_tokens': self.prompt_tokens / self.turns if self.turns else 0.0,
+                'max_prompt_tokens': self.max_prompt_tokens,
+                'last_prompt_tokens': self.last_prompt_tokens,
+                'mean_history_tokens': self.history_tokens / self.turns if self.turns else 0.0,
+                'trimmed_messages': self.trimmed_messages,
+                'compacted_tokens': self.compacted_tokens,
+                'evicted_threads': self.evicted_threads,
+            }
+
+    def close(self):
+        self._conn.close()
+        conn = getattr(self.checkpointer, "conn", None)
+        if isinstance(conn, sqlite3.Connection):
+            conn.close()
+
+    async def aclose(self):
+        self._conn.close()
+        await self.checkpointer.conn.close()
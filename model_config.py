@@ -1,46 +1,72 @@
 from langchain.chat_models import init_chat_model
 from time import time
 import os
+from config import get_groq_api_key
 from langchain_groq import ChatGroq
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import START, MessagesState, StateGraph
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from memory import ConversationMemory
 
 
 def setup_model():
 #    llm = init_chat_model("meta-llama/llama-4-scout-17b-16e-instruct", model_provider="groq")
+    get_groq_api_key()
     llm = ChatGroq(model_name="compound-beta-mini")
     return llm
 
 
 
-def setup_workflow():
+def _cached_response(config: RunnableConfig):
+    # an answer from the response cache (caching.py) stands in for the model,
+    # the turn still goes through the memory window and activity tracking
+    answer = config["configurable"].get("cached_answer")
+    return None if answer is None else AIMessage(content=answer)
 
-    model=setup_model()
+
+def setup_workflow(model=None, memory=None):
+
+    model = model or setup_model()
+    # SQLite checkpoints with compacted, windowed threads (memory.py)
+    memory = memory or ConversationMemory()
 
     workflow = StateGraph(state_schema=MessagesState)
 
 
+    system_prompt = (
+        "You are an E-Commerce bot, and assigned to reply to customers, "
+        "you are strictly prohibited to reply any other irrelevant questions."
+        "Answer all questions to the best of your ability using the provided context."
+    )
+
     # Define the function that calls the model
-    def call_model(state: MessagesState):
-        system_prompt = (
-            "You are an E-Commerce bot, and assigned to reply to customers, "
-            "you are strictly prohibited to reply any other irrelevant questions."
-            "Answer all questions to the best of your ability using the provided context."
-        )
-        messages = [SystemMessage(content=system_prompt)] + state["messages"]
-        response = model.invoke(messages)
-        return {"messages": response}
+    def call_model(state: MessagesState, config: RunnableConfig):
+        response = _cached_response(config)
+        if response is None:
+            messages = [SystemMessage(content=system_prompt)] + memory.context(state["messages"])
+            memory.record_prompt(messages)
+            # passing config lets stream_mode="messages" pick up the model's tokens
+            response = model.invoke(messages, config)
+        memory.delete_threads(memory.touch(config["configurable"]["thread_id"]))
+        return {"messages": memory.updates(state["messages"], response)}
+
+    # same node for app.ainvoke, awaits the model instead of blocking a thread
+    async def acall_model(state: MessagesState, config: RunnableConfig):
+        response = _cached_response(config)
+        if response is None:
+            messages = [SystemMessage(content=system_prompt)] + memory.context(state["messages"])
+            memory.record_prompt(messages)
+            response = await model.ainvoke(messages, config)
+        await memory.adelete_threads(await memory.atouch(config["configurable"]["thread_id"]))
+        return {"messages": memory.updates(state["messages"], response)}
 
 
     # Define the node and edge
-    workflow.add_node("model", call_model)
+    workflow.add_node("model", RunnableLambda(call_model, afunc=acall_model))
     workflow.add_edge(START, "model")
 
-    # Add simple in-memory checkpointer
-    memory = MemorySaver()
-    app = workflow.compile(checkpointer=memory)
+    app = workflow.compile(checkpointer=memory.checkpointer)
 
     return app
 
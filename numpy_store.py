@@ -0,0 +1,461 @@
+import json
+import logging
+import os
+import tempfile
+import weakref
+from time import time
+from typing import Any, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from config import NUMPY_STORE_DIR, NUMPY_STORE_DTYPE, EMBEDDING_DIM, VECTOR_QUANTIZATION, RERANK_FACTOR
+from config import ANN_INDEX, ANNOY_N_TREES, ANNOY_SEARCH_K
+from ann_index import AnnoyCandidates
+from quantization import SearchIndex, block_scores, normalize
+
+logger = logging.getLogger(__name__)
+
+# rows copied per step when persist rewrites the embedding matrix
+COPY_BATCH_SIZE = 8192
+# upserted vectors wait on disk for persist(), float32 rows appended batch by batch
+# to a file of this prefix, one per store instance
+SPOOL_PREFIX = "pending_vectors_"
+
+
+def _remove_file(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _write_strings(path: str, name: str, strings: Iterable[str]):
+    """
+    Store strings as one utf-8 blob `<name>.bin` plus `<name>_offsets.npy`,
+    string i being blob[offsets[i]:offsets[i + 1]].
+    """
+    offsets = [0]
+    with open(os.path.join(path, f"{name}.bin.tmp"), "wb") as f:
+        for text in strings:
+            data = text.encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(os.path.join(path, f"{name}_offsets.tmp.npy"), np.asarray(offsets, dtype=np.int64))
+
+
+class _StringColumn:
+    """
+    Read side of _write_strings, memory-mapped.
+    """
+
+    def __init__(self, path: str, name: str):
+        self.offsets = np.load(os.path.join(path, f"{name}_offsets.npy"), mmap_mode='r')
+        blob_path = os.path.join(path, f"{name}.bin")
+        # np.memmap refuses empty files
+        self.blob = np.memmap(blob_path, dtype=np.uint8, mode='r') if os.path.getsize(blob_path) else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vector store kept as plain files and memory-mapped on open.
+
+    Embeddings are L2 normalized rows of `embeddings.npy` (float32 or float16),
+    so cosine similarity for a query is one matrix-vector product followed by
+    `argpartition`. Chunk ids and texts are utf-8 blobs with offset arrays, and
+    each metadata field is dictionary encoded (a code per row plus the distinct
+    values), which makes metadata filters vectorized comparisons. Opening maps
+    the files without reading them, and the pages are shared between every
+    process that opens the same store.
+
+    With `truncate_dim` (Matryoshka truncation) or a `quantization` other than
+    "none", searching is two-stage: a coarse pass over a compact SearchIndex
+    picks `rerank_factor * k` candidates, which are then rescored against the
+    full precision embeddings. With `ann="annoy"` the candidates come from an
+    Annoy forest instead of scoring every row. Both indexes are derived from
+    embeddings.npy and cached next to it, so changing these settings never
+    re-embeds anything.
+
+    The store also provides the subset of the Chroma collection API the
+    builder and the BM25 index use (`count`, `get`, `upsert`), exposed as
+    `_collection`. Writes are buffered until `persist()`, the vectors in a
+    spool file next to the store, so a build never holds them all in memory.
+    """
+
+    def __init__(self, embedding_function: Embeddings, persist_directory: str = NUMPY_STORE_DIR,
+                 dtype: str = NUMPY_STORE_DTYPE, truncate_dim: Optional[int] = EMBEDDING_DIM,
+                 quantization: str = VECTOR_QUANTIZATION, rerank_factor: int = RERANK_FACTOR,
+                 ann: Optional[str] = ANN_INDEX, n_trees: int = ANNOY_N_TREES, search_k: int = ANNOY_SEARCH_K):
+        self.embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.dtype = np.dtype(dtype)
+        self.truncate_dim = truncate_dim
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.ann_type = ann
+        self.n_trees = n_trees
+        self.search_k = search_k
+        self._pending = {}
+        self._deleted = set()
+        self._spool_path, self._spool_rows, self._spool_dim = None, 0, None
+        self._open()
+
+    # loading
+
+    def _open(self):
+        path = self.persist_directory
+        self.vectors = None
+        self.index = None
+        self.ann = None
+        self.ids, self.texts = [], []
+        self.fields = {}
+        self._row_of = None
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        vectors = np.load(os.path.join(path, "embeddings.npy"), mmap_mode='r')
+        ids = _StringColumn(path, "ids")
+        texts = _StringColumn(path, "texts")
+        if not (len(vectors) == len(ids) == len(texts) == meta['count']):
+            # a write was interrupted, treat the store as empty so it gets rebuilt
+            logger.warning(f"Inconsistent numpy vector store in {path}, ignoring it")
+            return
+        self.vectors, self.ids, self.texts = vectors, ids, texts
+        self.fields = {}
+        for field in meta['fields']:
+            encoded = list(_StringColumn(path, f"field_{field}_values"))
+            self.fields[field] = (
+                np.load(os.path.join(path, f"field_{field}_codes.npy"), mmap_mode='r'),
+                [json.loads(v) for v in encoded],
+                {v: code for code, v in enumerate(encoded)}
+            )
+        if self.ann_type is not None:
+            self.ann = self._load_ann()
+        else:
+            self.index = self._load_index()
+
+    def _search_dim(self) -> int:
+        full_dim = self.vectors.shape[1]
+        return min(self.truncate_dim or full_dim, full_dim)
+
+    def _load_ann(self) -> AnnoyCandidates:
+        if self.ann_type != "annoy":
+            raise ValueError(f"Unknown ANN index: {self.ann_type}")
+        dim, path = self._search_dim(), self.persist_directory
+        if os.path.exists(os.path.join(path, AnnoyCandidates.file_name(dim, self.n_trees))):
+            return AnnoyCandidates.load(path, dim, self.n_trees, self.search_k)
+        start = time()
+        ann = AnnoyCandidates.build(self.vectors, dim, self.n_trees, path, self.search_k)
+        logger.info(f"Built Annoy index with {self.n_trees} trees at {dim} dims in {time() - start:.1f}s")
+        return ann
+
+    def _load_index(self) -> Optional[SearchIndex]:
+        """
+        Coarse search index for the configured dimension and quantization,
+        built from the stored embeddings the first time. None means plain exact
+        search over the full vectors.
+        """
+        dim = self._search_dim()
+        if self.quantization == "none" and dim == self.vectors.shape[1]:
+            return None
+        path = self.persist_directory
+        if not os.path.exists(os.path.join(path, SearchIndex.file_name(dim, self.quantization))):
+            index = SearchIndex.build(self.vectors, dim, self.quantization)
+            index.save(path)
+            logger.info(f"Built {self.quantization} search index at {dim} dims ({index.nbytes / 2**20:.1f} MiB)")
+        return SearchIndex.load(path, dim, self.quantization)
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+    @property
+    def _collection(self):
+        return self
+
+    def _rows(self) -> dict:
+        # chunk id -> row, only built when ids are looked up
+        if self._row_of is None:
+            self._row_of = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        return self._row_of
+
+    def _metadata(self, row: int) -> dict:
+        metadata = {}
+        for field, (codes, values, _) in self.fields.items():
+            code = codes[row]
+            if code >= 0:
+                metadata[field] = values[code]
+        return metadata
+
+    def _document(self, row: int) -> Document:
+        return Document(id=self.ids[row], page_content=self.texts[row], metadata=self._metadata(row))
+
+    # collection API
+
+    def count(self) -> int:
+        return len(self.ids) if self.vectors is not None else 0
+
+    def upsert(self, ids, embeddings, metadatas=None, documents=None):
+        metadatas = metadatas or [{}] * len(ids)
+        documents = documents or [""] * len(ids)
+        # each batch is appended to the spool file, only texts and metadata stay in memory
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not len(embeddings):
+            return
+        if self._spool_path is None:
+            os.makedirs(self.persist_directory, exist_ok=True)
+            fd, self._spool_path = tempfile.mkstemp(prefix=SPOOL_PREFIX, suffix=".f32", dir=self.persist_directory)
+            os.close(fd)
+            # removed with the store if it is dropped without persist()
+            self._spool_cleanup = weakref.finalize(self, _remove_file, self._spool_path)
+            self._spool_dim = embeddings.shape[1]
+        with open(self._spool_path, "ab") as f:
+            f.write(np.ascontiguousarray(embeddings).tobytes())
+        for row, (chunk_id, metadata, text) in enumerate(zip(ids, metadatas, documents), self._spool_rows):
+            self._pending[chunk_id] = (row, text, metadata)
+            self._deleted.discard(chunk_id)
+        self._spool_rows += len(embeddings)
+
+    def _remove_spool(self):
+        if self._spool_path is not None:
+            self._spool_cleanup()
+        self._spool_path, self._spool_rows, self._spool_dim = None, 0, None
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        """
+        Chroma style `get`: rows by id and/or metadata filter, as a dict of lists.
+        """
+        if self.vectors is None:
+            rows = np.arange(0)
+        elif ids is not None:
+            row_of = self._rows()
+            rows = np.asarray([row_of[i] for i in ids if i in row_of], dtype=np.int64)
+        else:
+            rows = np.arange(self.count())
+        if where:
+            rows = rows[self._filter_mask(where)[rows]]
+        start = offset or 0
+        rows = rows[start:start + limit] if limit is not None else rows[start:]
+
+        result = {'ids': [self.ids[i] for i in rows]}
+        if "documents" in include:
+            result['documents'] = [self.texts[i] for i in rows]
+        if "metadatas" in include:
+            result['metadatas'] = [self._metadata(i) for i in rows]
+        return result
+
+    # filters
+
+    def _condition_mask(self, field: str, value) -> np.ndarray:
+        if isinstance(value, dict):
+            if set(value) != {"$eq"}:
+                raise ValueError(f"Unsupported filter operator in {value}")
+            value = value["$eq"]
+        if field not in self.fields:
+            return np.zeros(self.count(), dtype=bool)
+        codes, _, code_of = self.fields[field]
+        code = code_of.get(json.dumps(value))
+        if code is None:
+            return np.zeros(self.count(), dtype=bool)
+        return np.asarray(codes) == code
+
+    def _filter_mask(self, where: dict) -> np.ndarray:
+        """
+        Boolean row mask for a Chroma style where clause (equality conditions,
+        optionally combined with $and).
+        """
+        mask = np.ones(self.count(), dtype=bool)
+        for field, value in where.items():
+            if field == "$and":
+                for clause in value:
+                    mask &= self._filter_mask(clause)
+            else:
+                mask &= self._condition_mask(field, value)
+        return mask
+
+    # search
+
+    def _search(self, query_vectors: np.ndarray, k: int, filter: Optional[dict] = None):
+        """
+        Top-k (row, cosine similarity) per query vector.
+        """
+        if self.vectors is None or not self.count():
+            return [[] for _ in query_vectors]
+        query_vectors = normalize(query_vectors)
+        k = min(k, self.count())
+        if self.ann is not None:
+            mask = self._filter_mask(filter) if filter else None
+            return [self._ann_search(query_vector, k, mask) for query_vector in query_vectors]
+
+        index = self.index
+        scores = index.scores(query_vectors) if index is not None else block_scores(self.vectors, query_vectors)
+        if filter:
+            scores[:, ~self._filter_mask(filter)] = -np.inf
+
+        results = []
+        n_candidates = k if index is None else min(k * self.rerank_factor, self.count())
+        for query_vector, row_scores in zip(query_vectors, scores):
+            top = np.argpartition(-row_scores, n_candidates - 1)[:n_candidates]
+            top = top[np.isfinite(row_scores[top])]
+            if index is not None:
+                results.append(self._rerank(query_vector, top, k))
+                continue
+            top = top[np.argsort(-row_scores[top])]
+            results.append([(int(i), float(row_scores[i])) for i in top])
+        return results
+
+    def _rerank(self, query_vector: np.ndarray, rows: np.ndarray, k: int):
+        # score candidates with full precision, reading rows in file order
+        rows = np.sort(rows)
+        exact = np.asarray(self.vectors[rows], dtype=np.float32) @ query_vector
+        order = np.argsort(-exact)[:k]
+        return [(int(rows[i]), float(exact[i])) for i in order]
+
+    def _ann_search(self, query_vector: np.ndarray, k: int, mask: Optional[np.ndarray] = None):
+        rows = self.ann.search(query_vector, min(k * self.rerank_factor, self.count()))
+        if mask is not None:
+            rows = rows[mask[rows]]
+            if len(rows) < k:
+                # a selective filter leaves too few neighbours, score the matching rows exactly
+                rows = np.flatnonzero(mask)
+        return self._rerank(query_vector, rows, k)
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        return [(self._document(row), score) for row, score in self._search([embedding], k, filter)[0]]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_batch(self, queries: List[str], k: int = 4,
+                                filter: Optional[dict] = None) -> List[List[Document]]:
+        """
+        Search several queries at once: one embedding call and one matrix product.
+        """
+        vectors = self.embedding_function.embed_documents(list(queries))
+        return [[self._document(row) for row, _ in hits] for hits in self._search(vectors, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # scores are already cosine similarities
+        return lambda score: score
+
+    def get_by_ids(self, ids) -> List[Document]:
+        row_of = self._rows()
+        return [self._document(row_of[i]) for i in ids if i in row_of]
+
+    # writes
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        ids = ids or [str(len(self._pending) + self.count() + i) for i in range(len(texts))]
+        self.upsert(ids, self.embedding_function.embed_documents(texts), metadatas, texts)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        for chunk_id in ids or []:
+            self._deleted.add(chunk_id)
+            self._pending.pop(chunk_id, None)
+        return True
+
+    def reset_collection(self):
+        """
+        Drop every stored and buffered chunk, as Chroma.reset_collection does.
+        The files are rewritten by the next persist().
+        """
+        self._deleted.update(self.ids)
+        self._pending = {}
+        self._remove_spool()
+
+    def persist(self):
+        """
+        Write the buffered upserts and deletes, rewriting the store files.
+        """
+        if not self._pending and not self._deleted:
+            return
+        path = self.persist_directory
+        os.makedirs(path, exist_ok=True)
+
+        kept = [
+            i for i, chunk_id in enumerate(self.ids)
+            if chunk_id not in self._deleted and chunk_id not in self._pending
+        ] if self.vectors is not None else []
+        new = list(self._pending.items())
+        count = len(kept) + len(new)
+        dim = self.vectors.shape[1] if self.vectors is not None else self._spool_dim or 0
+
+        vectors = np.lib.format.open_memmap(
+            os.path.join(path, "embeddings.tmp.npy"), mode='w+', dtype=self.dtype, shape=(count, dim)
+        )
+        for start in range(0, len(kept), COPY_BATCH_SIZE):
+            rows = kept[start:start + COPY_BATCH_SIZE]
+            vectors[start:start + len(rows)] = self.vectors[rows]
+        if new:
+            spool = np.memmap(self._spool_path, dtype=np.float32, mode='r', shape=(self._spool_rows, dim))
+            spool_rows = np.asarray([row for _, (row, _, _) in new], dtype=np.int64)
+            for start in range(0, len(new), COPY_BATCH_SIZE):
+                added = np.asarray(spool[spool_rows[start:start + COPY_BATCH_SIZE]])
+                added /= np.maximum(np.linalg.norm(added, axis=1, keepdims=True), 1e-12)
+                vectors[len(kept) + start:len(kept) + start + len(added)] = added
+            del spool
+        vectors.flush()
+        del vectors
+
+        _write_strings(path, "ids", [self.ids[i] for i in kept] + [chunk_id for chunk_id, _ in new])
+        _write_strings(path, "texts", [self.texts[i] for i in kept] + [text for _, (_, text, _) in new])
+
+        metadatas = [self._metadata(i) for i in kept] + [metadata or {} for _, (_, _, metadata) in new]
+        fields = sorted({field for metadata in metadatas for field in metadata})
+        for field in fields:
+            values, codes = {}, np.full(count, -1, dtype=np.int32)
+            for row, metadata in enumerate(metadatas):
+                if field in metadata:
+                    codes[row] = values.setdefault(json.dumps(metadata[field]), len(values))
+            np.save(os.path.join(path, f"field_{field}_codes.tmp.npy"), codes)
+            _write_strings(path, f"field_{field}_values", list(values))
+
+        # release the old maps before their files are replaced
+        if self.ann is not None:
+            self.ann.close()
+        self.vectors, self.index, self.ann = None, None, None
+        self.ids, self.texts, self.fields, self._row_of = [], [], {}, None
+        for name in os.listdir(path):
+            if name.startswith(("index_", "annoy_")):
+                # search indexes were derived from the old rows
+                os.remove(os.path.join(path, name))
+            elif ".tmp" in name:
+                os.replace(os.path.join(path, name), os.path.join(path, name.replace(".tmp", "")))
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({'count': count, 'dim': dim, 'dtype': self.dtype.name, 'fields': fields}, f)
+
+        self._pending, self._deleted = {}, set()
+        self._remove_spool()
+        self._open()
+        logger.info(f"Persisted {count} chunks to {path} ({len(new)} written, {len(kept)} kept)")
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        store.persist()
+        return store
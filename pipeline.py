@@ -0,0 +1,174 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from memory import turn_message
+from caching import ainvoke_with_response_cache
+from context_builder import ContextBuilder
+from config import PIPELINE_WORKERS, SPECULATIVE_RETRIEVAL
+from database import execute_sql_query, get_data_version, get_main_categories
+from retrieval import retrieve_documents
+
+logger = logging.getLogger(__name__)
+
+
+def build_answer_prompt(query: str, formatted_results: str, used_vectorstore: bool,
+                        sql_query: str = None, params=None) -> str:
+    """
+    Prompt for the answer model, built from either SQL results or retrieved documents.
+    """
+    if used_vectorstore:
+        return f"""
+            Original Query: {query}
+
+            (No SQL results, using vectorstore retrieval)
+
+            Retrieved Documents:
+            {formatted_results}
+
+            Instructions:
+            1. Analyze the retrieved documents carefully
+            2. Answer the original query using the information from the documents
+            3. If the documents don't fully answer the question, explain what information is available
+            4. Be specific and include relevant details from the documents
+            5. Format your response as a helpful ecommerce assistant would
+            6. If there are multiple documents, summarize key insights
+            7. Remember our previous conversation and provide contextual responses when relevant
+
+            Please provide a clear, helpful response based on the data above.
+            """
+    return f"""
+            Original Query: {query}
+
+            SQL Query Executed: {sql_query}{f' (parameters: {params})' if params else ''}
+
+            Query Results:
+            {formatted_results}
+
+            Instructions:
+            1. Analyze the query results carefully
+            2. Answer the original query using the data from the SQL results
+            3. If the data doesn't fully answer the question, explain what information is available
+            4. Be specific and include relevant details from the results
+            5. Format your response as a helpful ecommerce assistant would
+            6. If there are multiple results, summarize key insights
+            7. Remember our previous conversation and provide contextual responses when relevant
+
+            Please provide a clear, helpful response based on the data above.
+            """
+
+
+class ChatPipeline:
+    """
+    Asyncio version of the query path in main.main.
+
+    LLM calls go through `ainvoke`, while SQLite queries, cache lookups and
+    vector retrieval (embedding the query) run on a thread pool, so a single
+    event loop can serve many conversations at once.
+    """
+
+    def __init__(self, query_analyzer, workflow, pool, vectordb=None, response_cache=None, bm25_index=None,
+                 k: int = 5, max_workers: int = PIPELINE_WORKERS, speculative: bool = SPECULATIVE_RETRIEVAL,
+                 context_builder=None):
+        self.query_analyzer = query_analyzer
+        self.workflow = workflow
+        self.pool = pool
+        self.vectordb = vectordb
+        self.bm25_index = bm25_index
+        # known product categories, turned into metadata filters per query
+        self.categories = get_main_categories(pool) if vectordb is not None else []
+        self.response_cache = response_cache
+        # SQL rows / documents rendered into the answer prompt within a token budget
+        self.context_builder = context_builder or ContextBuilder()
+        self.k = k
+        # start the vector search together with SQL generation instead of after it
+        self.speculative = speculative and vectordb is not None
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+
+    async def _run_blocking(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def answer(self, query: str, thread_id: str) -> dict:
+        """
+        Answer one user query in the given conversation thread.
+
+        Returns the answer (None with an 'error' when there is nothing to
+        answer from), the SQL that was run, whether the vectorstore fallback
+        was used and per stage timings in seconds.
+        """
+        config = {"configurable": {"thread_id": str(thread_id)}}
+        timings = {}
+        start = perf_counter()
+
+        speculative = None
+        if self.speculative:
+            speculative = asyncio.ensure_future(
+                self._run_blocking(
+                    retrieve_documents, self.vectordb, query, self.k, self.bm25_index, self.categories
+                )
+            )
+
+        try:
+            sql_result = await self.query_analyzer.agenerate_sql_query(query)
+            timings['sql_generation'] = perf_counter() - start
+            if not sql_result or 'sql_query' not in sql_result:
+                return {'answer': None, 'error': "Could not generate SQL query from your request.", 'timings': timings}
+
+            sql_query = sql_result['sql_query']
+            params = sql_result.get('params')
+            if not self.query_analyzer.validate_sql(sql_query):
+                return {'answer': None, 'error': "Generated SQL query appears to be invalid or unsafe.",
+                        'sql_query': sql_query, 'timings': timings}
+
+            stage = perf_counter()
+            result_df = await self._run_blocking(execute_sql_query, self.pool, sql_query, params)
+            timings['sql_execution'] = perf_counter() - stage
+
+            used_vectorstore = False
+            if result_df.empty and self.vectordb is not None:
+                # with speculation this only waits for whatever is left of the search
+                stage = perf_counter()
+                if speculative is not None:
+                    relevant_docs = await speculative
+                else:
+                    relevant_docs = await self._run_blocking(
+                        retrieve_documents, self.vectordb, query, self.k, self.bm25_index, self.categories
+                    )
+                timings['retrieval'] = perf_counter() - stage
+                if not relevant_docs:
+                    return {'answer': None, 'error': "No results found in SQL or vectorstore.",
+                            'sql_query': sql_query, 'timings': timings}
+                formatted_results = self.context_builder.document_context(relevant_docs, query)
+                used_vectorstore = True
+            else:
+                formatted_results = self.context_builder.sql_context(result_df, query)
+        finally:
+            # the SQL path won, the speculative search result is discarded
+            if speculative is not None and not speculative.done():
+                speculative.cancel()
+
+        prompt = build_answer_prompt(query, formatted_results, used_vectorstore, sql_query, params)
+        input_messages = [turn_message(prompt, query)]
+
+        stage = perf_counter()
+        if self.response_cache is not None:
+            self.response_cache.set_data_version(await self._run_blocking(get_data_version, self.pool))
+            answer = await ainvoke_with_response_cache(
+                self.workflow, config, input_messages, query, formatted_results, self.response_cache
+            )
+        else:
+            result = await self.workflow.ainvoke({"messages": input_messages}, config)
+            answer = result["messages"][-1].content
+        timings['answer'] = perf_counter() - stage
+        timings['total'] = perf_counter() - start
+
+        return {
+            'answer': answer,
+            'sql_query': sql_query,
+            'sql_path': sql_result.get('path'),
+            'used_vectorstore': used_vectorstore,
+            'timings': timings,
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False)
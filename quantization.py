@@ -0,0 +1,129 @@
+import os
+import numpy as np
+
+# rows converted per step, bounds the float32 copies of a large matrix
+BLOCK_SIZE = 8192
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+# set bits per byte value, for hamming distances on packed binary codes
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def normalize(vectors) -> np.ndarray:
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return vectors
+
+
+def truncate(vectors, dim: int) -> np.ndarray:
+    """
+    First `dim` components, renormalized. With a Matryoshka (MRL) model the
+    prefix of an embedding is itself a usable lower dimensional embedding.
+    """
+    return normalize(np.asarray(vectors)[:, :dim])
+
+
+def block_scores(matrix, query_vectors: np.ndarray) -> np.ndarray:
+    """
+    `matrix @ query_vectors.T`, transposed to (queries, rows), in float32.
+    Non float32 matrices (float16, int8, memory-mapped) are upcast a block at
+    a time, since numpy only has a BLAS path for float32/float64.
+    """
+    if matrix.dtype == np.float32:
+        return np.asarray(matrix @ query_vectors.T).T
+    scores = np.empty((len(query_vectors), len(matrix)), dtype=np.float32)
+    for start in range(0, len(matrix), BLOCK_SIZE):
+        block = np.asarray(matrix[start:start + BLOCK_SIZE], dtype=np.float32)
+        scores[:, start:start + len(block)] = (block @ query_vectors.T).T
+    return scores
+
+
+class SearchIndex:
+    """
+    Compact copy of the store's embeddings for the coarse search stage.
+
+    The vectors are truncated to `dim` and then kept as float32 ("none"),
+    int8 with a per-dimension scale ("int8", 4x smaller than float32) or one
+    sign bit per dimension ("binary", 32x smaller, scored by hamming
+    distance). Scores only need to rank candidates, the store reranks them
+    against the full precision vectors.
+    """
+
+    def __init__(self, dim: int, quantization: str, codes, scale=None):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.dim = dim
+        self.quantization = quantization
+        self.codes = codes
+        self.scale = scale
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    @staticmethod
+    def file_name(dim: int, quantization: str) -> str:
+        return f"index_{quantization}_{dim}.npy"
+
+    @classmethod
+    def build(cls, vectors, dim: int, quantization: str = "none"):
+        blocks = range(0, len(vectors), BLOCK_SIZE)
+
+        def truncated(start):
+            return truncate(vectors[start:start + BLOCK_SIZE], dim)
+
+        if quantization == "int8":
+            max_abs = np.zeros(dim, dtype=np.float32)
+            for start in blocks:
+                np.maximum(max_abs, np.abs(truncated(start)).max(axis=0), out=max_abs)
+            scale = np.maximum(max_abs, 1e-12) / 127
+            codes = np.empty((len(vectors), dim), dtype=np.int8)
+            for start in blocks:
+                block = np.rint(truncated(start) / scale)
+                codes[start:start + len(block)] = np.clip(block, -127, 127)
+            return cls(dim, quantization, codes, scale)
+
+        if quantization == "binary":
+            codes = np.empty((len(vectors), (dim + 7) // 8), dtype=np.uint8)
+            for start in blocks:
+                block = np.packbits(truncated(start) > 0, axis=1)
+                codes[start:start + len(block)] = block
+            return cls(dim, quantization, codes)
+
+        codes = np.empty((len(vectors), dim), dtype=np.float32)
+        for start in blocks:
+            block = truncated(start)
+            codes[start:start + len(block)] = block
+        return cls(dim, quantization, codes)
+
+    def save(self, path: str):
+        np.save(os.path.join(path, self.file_name(self.dim, self.quantization)), self.codes)
+        if self.scale is not None:
+            np.save(os.path.join(path, f"index_scale_{self.dim}.npy"), self.scale)
+
+    @classmethod
+    def load(cls, path: str, dim: int, quantization: str):
+        codes = np.load(os.path.join(path, cls.file_name(dim, quantization)), mmap_mode='r')
+        scale = np.load(os.path.join(path, f"index_scale_{dim}.npy")) if quantization == "int8" else None
+        return cls(dim, quantization, codes, scale)
+
+    def scores(self, query_vectors: np.ndarray) -> np.ndarray:
+        """
+        Coarse similarity of every row to each (full dimension) query, higher is better.
+        """
+        queries = truncate(query_vectors, self.dim)
+        if self.quantization == "int8":
+            # codes * scale approximates the vectors, fold the scale into the query instead
+            return block_scores(self.codes, queries * self.scale)
+        if self.quantization == "binary":
+            scores = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+            query_bits = np.packbits(queries > 0, axis=1)
+            for i, bits in enumerate(query_bits):
+                distance = POPCOUNT[np.bitwise_xor(self.codes, bits)].sum(axis=1, dtype=np.int32)
+                scores[i] = self.dim - 2 * distance
+            return scores
+        return block_scores(self.codes, queries)
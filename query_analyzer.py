@@ -1,11 +1,20 @@
 from typing import Dict, Any, Optional
+import asyncio
 import json
 import re
+import threading
+from time import perf_counter
 from data_loader import get_dataset_type
+from intent_router import match_intent
 
 class QueryAnalyzer:
-    def __init__(self, llm=None):
+    def __init__(self, llm=None, cache=None):
         self.llm = llm
+        # optional caching.SemanticSQLCache consulted before the LLM
+        self.cache = cache
+        # path -> [queries, seconds] for template / cache / llm answered queries
+        self._path_stats = {'template': [0, 0.0], 'cache': [0, 0.0], 'llm': [0, 0.0]}
+        self._stats_lock = threading.Lock()
         # Define database schema for both tables
         self.order_schema = {
             'table_name': 'orders',
@@ -37,10 +46,76 @@ class QueryAnalyzer:
             }
         }
 
+    def _record_path(self, path: str, start: float, result: Dict[str, Any]) -> Dict[str, Any]:
+        elapsed = perf_counter() - start
+        with self._stats_lock:
+            self._path_stats[path][0] += 1
+            self._path_stats[path][1] += elapsed
+        result['path'] = path
+        return result
+
+    def latency_report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Number of queries and average SQL generation latency per path.
+        """
+        with self._stats_lock:
+            return {
+                path: {'queries': count, 'avg_ms': 1000 * seconds / count if count else 0.0}
+                for path, (count, seconds) in self._path_stats.items()
+            }
+
+    def _fast_path(self, query: str, start: float) -> Optional[Dict[str, Any]]:
+        """
+        Answer from the intent templates or the SQL cache, None if the LLM is needed.
+        """
+        intent = match_intent(query)
+        if intent is not None:
+            print(f"Template SQL ({intent['intent']}): {intent['sql_query']} {intent['params']}")
+            return self._record_path('template', start, intent)
+
+        if self.cache is not None:
+            cached = self.cache.lookup(query)
+            if cached is not None:
+                cache_key = cached.pop('cache_key')
+                # the cached SQL still has to pass validation before it's reused
+                if self.validate_sql(cached['sql_query']):
+                    print(f"Cached SQL ({cached['cache_hit']}): {cached['sql_query']}")
+                    return self._record_path('cache', start, cached)
+                self.cache.discard(cache_key)
+        return None
+
     def generate_sql_query(self, query: str) -> Dict[str, Any]:
         """
-        Generate SQL query from natural language query using LLM
+        Generate SQL query from natural language query.
+
+        Recognized high frequency intents are answered from parameterized
+        templates, then the SQL cache is tried and only the remaining queries
+        go to the LLM.
         """
+        start = perf_counter()
+        result = self._fast_path(query, start)
+        if result is not None:
+            return result
+
+        prompt, schema, dataset_type = self._llm_prompt(query)
+        response = self.llm.invoke(prompt)
+        return self._record_path('llm', start, self._llm_result(query, response, schema, dataset_type))
+
+    async def agenerate_sql_query(self, query: str) -> Dict[str, Any]:
+        """
+        Async generate_sql_query, the LLM round trip goes through `ainvoke`.
+        """
+        start = perf_counter()
+        # the cache lookup embeds the query, keep that off the event loop
+        result = await asyncio.get_running_loop().run_in_executor(None, self._fast_path, query, start)
+        if result is not None:
+            return result
+
+        prompt, schema, dataset_type = self._llm_prompt(query)
+        response = await self.llm.ainvoke(prompt)
+        return self._record_path('llm', start, self._llm_result(query, response, schema, dataset_type))
+
+    def _llm_prompt(self, query: str):
         dataset_type = get_dataset_type(query)
         schema = self.product_schema if dataset_type == 'product' else self.order_schema
         
@@ -76,7 +151,9 @@ class QueryAnalyzer:
         if not self.llm:
             raise ValueError("LLM is required for SQL query generation")
             
-        response = self.llm.invoke(prompt)
+        return prompt, schema, dataset_type
+
+    def _llm_result(self, query: str, response, schema: Dict[str, Any], dataset_type: str) -> Dict[str, Any]:
         sql_query = response.content if hasattr(response, 'content') else str(response)
         sql_query = sql_query.strip()
         
@@ -90,11 +167,14 @@ class QueryAnalyzer:
         sql_query = sql_query.rstrip(';') + ';'
         
         print(f"Generated SQL: {sql_query}")
-        return {
+        result = {
             'sql_query': sql_query,
             'table_name': schema['table_name'],
             'dataset_type': dataset_type
         }
+        if self.cache is not None and self.validate_sql(sql_query):
+            self.cache.store(query, result)
+        return result
 
 
 #check if it is a valid sql or not
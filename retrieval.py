@@ -0,0 +1,148 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from config import HYBRID_DENSE_WEIGHT
+from data_loader import dataset_keyword_matches
+from intent_router import extract_customer_id
+
+logger = logging.getLogger(__name__)
+
+# background threads for speculative retrieval, shared by the sync entry points
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+
+
+def query_filters(query: str, categories=()) -> dict:
+    """
+    Metadata conditions implied by a query, least specific first.
+
+    A customer id means order rows, a known main_category means product rows,
+    otherwise the dataset type is only pinned when the query's keywords clearly
+    lean one way (get_dataset_type defaults to 'order' on a tie, which would
+    hide every product from a plain product name search).
+    """
+    conditions = {}
+    query_lower = query.lower()
+    customer_id = extract_customer_id(query)
+    category = max((c for c in categories if c and c.lower() in query_lower), key=len, default=None)
+    product_matches, order_matches = dataset_keyword_matches(query)
+
+    if customer_id is not None:
+        conditions['dataset_type'] = 'order'
+        conditions['Customer_Id'] = str(customer_id)
+    elif category is not None:
+        conditions['dataset_type'] = 'product'
+        conditions['main_category'] = category
+    elif product_matches != order_matches:
+        conditions['dataset_type'] = 'product' if product_matches > order_matches else 'order'
+    return conditions
+
+
+def chroma_filter(conditions: dict):
+    """
+    Chroma `where` clause for the given equality conditions.
+    """
+    if not conditions:
+        return None
+    clauses = [{field: value} for field, value in conditions.items()]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _relaxations(conditions: dict):
+    # all conditions first, then drop the most specific one at a time, finally no filter
+    items = list(conditions.items())
+    for n in range(len(items), -1, -1):
+        yield dict(items[:n])
+
+
+def _min_max(scores: dict) -> dict:
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    span = high - low
+    return {key: (score - low) / span if span else 1.0 for key, score in scores.items()}
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses BM25 keyword matches with the dense vector search.
+
+    Both searches return `fetch_k` candidates, their scores are min-max
+    normalized per query and combined as
+    `dense_weight * dense + (1 - dense_weight) * bm25`. Exact product names,
+    SKUs and customer ids that the embedding blurs still rank through BM25.
+    `filters` restricts both searches to chunks with matching metadata.
+    """
+
+    vectordb: Any
+    bm25_index: Any
+    k: int = 5
+    fetch_k: int = 20
+    dense_weight: float = HYBRID_DENSE_WEIGHT
+    filters: dict = {}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        fetch_k = max(self.fetch_k, self.k)
+        docs = {}
+        dense = {}
+        where = chroma_filter(self.filters)
+        for doc, score in self.vectordb.similarity_search_with_relevance_scores(query, k=fetch_k, filter=where):
+            docs[doc.id] = doc
+            dense[doc.id] = score
+        mask = self.bm25_index.mask(self.filters) if self.filters else None
+        sparse = dict(self.bm25_index.search(query, k=fetch_k, mask=mask))
+
+        dense, sparse = _min_max(dense), _min_max(sparse)
+        fused = {
+            key: self.dense_weight * dense.get(key, 0.0) + (1 - self.dense_weight) * sparse.get(key, 0.0)
+            for key in dense.keys() | sparse.keys()
+        }
+        top = sorted(fused, key=fused.get, reverse=True)[:self.k]
+
+        missing = [key for key in top if key not in docs]
+        if missing:
+            for doc in self.vectordb.get_by_ids(missing):
+                docs[doc.id] = doc
+        return [docs[key] for key in top if key in docs]
+
+
+def retrieve_documents(vectordb, query: str, k: int = 5, bm25_index=None, categories=()):
+    """
+    Top-k documents for `query` from the vector store, [] if retrieval fails.
+    With a `bm25_index` the results are the hybrid BM25 + dense ranking.
+
+    The search is restricted by the metadata the query implies (see
+    query_filters, `categories` are the known product main categories). If
+    nothing matches, the filters are relaxed one at a time.
+    """
+    conditions = query_filters(query, categories)
+    try:
+        for filters in _relaxations(conditions):
+            if bm25_index is not None:
+                retriever = HybridRetriever(vectordb=vectordb, bm25_index=bm25_index, k=k,
+                                            fetch_k=4 * k, filters=filters)
+            else:
+                retriever = vectordb.as_retriever(search_kwargs={"k": k, "filter": chroma_filter(filters)})
+            docs = retriever.invoke(query)
+            if docs:
+                if filters != conditions:
+                    logger.info(f"No documents matched {conditions}, retrieved with {filters or 'no filter'}")
+                return docs
+        return []
+    except Exception as e:
+        logger.error(f"Vectorstore retrieval failed: {e}")
+        return []
+
+
+def start_retrieval(vectordb, query: str, k: int = 5, bm25_index=None, categories=()):
+    """
+    Start `retrieve_documents` in the background and return its future.
+
+    Used to run the vector search speculatively while the SQL path is still
+    generating and executing its query. Call `.result()` if the fallback is
+    needed, `.cancel()` otherwise (a search that already started simply has its
+    result discarded).
+    """
+    return _executor.submit(retrieve_documents, vectordb, query, k, bm25_index, categories)
@@ -0,0 +1,219 @@
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from time import perf_counter
+from config import HYBRID_RETRIEVAL, MODEL_HEALTH_CHECK, SQL_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_PROMPT = "Reply with the single word: ready"
+
+
+class StartupReport:
+    """
+    Wall clock of each startup phase, as (offset from process start, seconds).
+    Phases run in different threads, so offsets show what overlapped.
+    """
+
+    def __init__(self, started: float = None):
+        self.started = started if started is not None else perf_counter()
+        self._phases = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, perf_counter())
+
+    def record(self, name: str, start: float, end: float):
+        with self._lock:
+            self._phases[name] = (start - self.started, end - start)
+
+    def mark(self, name: str):
+        """
+        A point in time, e.g. the first prompt, recorded once.
+        """
+        now = perf_counter()
+        with self._lock:
+            self._phases.setdefault(name, (now - self.started, 0.0))
+
+    def report(self) -> str:
+        with self._lock:
+            phases = sorted(self._phases.items(), key=lambda item: item[1][0])
+        lines = [f"{'phase':<20} {'start s':>8} {'took s':>8}"]
+        lines += [f"{name:<20} {start:>8.3f} {seconds:>8.3f}" for name, (start, seconds) in phases]
+        return "\n".join(lines)
+
+
+class BackgroundStartup:
+    """
+    Builds the CLI's resources in background threads so the prompt can accept
+    queries straight away.
+
+    Three independent phases are submitted at once: the database (schema,
+    connection pool, category names), the model (LLM and workflow) and the
+    fallback index (data, vector store, BM25). Each is a future, and callers
+    block only on what a query actually needs: the SQL path waits for the
+    database and model, the vector store is waited for only on fallback.
+    Heavy modules (langchain, langgraph, torch, chroma) are imported inside
+    the phases, not when this module is imported.
+    """
+
+    def __init__(self, report: StartupReport, health_check: bool = MODEL_HEALTH_CHECK):
+        self.report = report
+        self.database = self._run_in_background("database", self._start_database)
+        self.model = self._run_in_background("model", self._start_model)
+        self.vectorstore = self._run_in_background("vectorstore", self._start_vectorstore)
+        self.health_check = None
+        if health_check:
+            self.health_check = self._run_in_background("health-check", self._check_model)
+        self._reported = False
+        self._report_lock = threading.Lock()
+        phases = [f for f in (self.database, self.model, self.vectorstore, self.health_check) if f is not None]
+        for future in phases:
+            future.add_done_callback(lambda _: self._report_when_done(phases))
+
+    @staticmethod
+    def _run_in_background(name: str, fn) -> Future:
+        # daemon threads, so quitting during a long vector store build does not
+        # wait for it (the stores only publish complete files and manifests)
+        future = Future()
+
+        def run():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                logger.error(f"Startup phase '{name}' failed: {e}")
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=f"startup-{name}", daemon=True).start()
+        return future
+
+    def _report_when_done(self, phases):
+        with self._report_lock:
+            if self._reported or not all(future.done() for future in phases):
+                return
+            self._reported = True
+        logger.info(f"Startup finished:\n{self.report.report()}")
+
+    def _start_database(self):
+        from database import setup_database, ConnectionPool, get_main_categories
+
+        with self.report.phase("database"):
+            setup_database().close()
+            pool = ConnectionPool()
+            # category names a query can mention, pushed into the retrieval filters
+            categories = get_main_categories(pool)
+        logger.info("Database setup completed")
+        return pool, categories
+
+    def _start_model(self):
+        with self.report.phase("model imports"):
+            from model_config import setup_model, setup_workflow
+            from caching import SemanticSQLCache, ResponseCache
+            from query_analyzer import QueryAnalyzer
+            from memory import ConversationMemory
+        with self.report.phase("model"):
+            llm = setup_model()
+            memory = ConversationMemory()
+            app = setup_workflow(llm, memory)
+            # generated SQL is cached by query text, and by query embedding once
+            # the vector store phase has loaded the embedding model
+            sql_cache = SemanticSQLCache(path=SQL_CACHE_PATH)
+            query_analyzer = QueryAnalyzer(llm=llm, cache=sql_cache)
+            # final answers, reused only for the same query, results and thread history
+            response_cache = ResponseCache()
+        return llm, app, query_analyzer, response_cache, memory
+
+    def _start_vectorstore(self):
+        with self.report.phase("vectorstore imports"):
+            from data_loader import load_data
+            from doc_processor import iter_documents
+            from vectorstore_builder import build_vectorstore
+            from bm25_index import load_or_build_bm25_index
+
+        with self.report.phase("load data"):
+            order_df, product_df = load_data()
+        with self.report.phase("vector store"):
+            # documents are streamed batch by batch into the vectorstore build
+            vectordb = build_vectorstore(iter_documents((order_df, product_df)))
+        logger.info("Vectorstore built for fallback retrieval")
+        bm25_index = None
+        if HYBRID_RETRIEVAL:
+            # keyword index over the same chunks, fused with the dense search
+            with self.report.phase("bm25 index"):
+                bm25_index = load_or_build_bm25_index(vectordb)
+        if self.model.exception() is None:
+            self.query_analyzer().cache.embedding_model = vectordb.embeddings
+        return vectordb, bm25_index
+
+    def _check_model(self):
+        from model_config import test_model
+
+        llm = self.model.result()[0]
+        with self.report.phase("model health check"):
+            test_model(llm, HEALTH_CHECK_PROMPT)
+
+    def pool(self):
+        return self.database.result()[0]
+
+    def categories(self):
+        return self.database.result()[1]
+
+    def workflow(self):
+        return self.model.result()[1]
+
+    def query_analyzer(self):
+        return self.model.result()[2]
+
+    def response_cache(self):
+        return self.model.result()[3]
+
+    def memory(self):
+        return self.model.result()[4]
+
+    def retrieval_index(self, wait: bool = True):
+        """
+        (vectordb, bm25_index), or None when not built yet and `wait` is False.
+        """
+        if not wait and not self.vectorstore.done():
+            return None
+        if not self.vectorstore.done():
+            logger.info("Waiting for the vector store build to finish...")
+        return self.vectorstore.result()
+
+    def wait(self):
+        """
+        Block until every phase is done, as the sequential startup did.
+        """
+        for future in (self.database, self.model, self.vectorstore, self.health_check):
+            if future is not None:
+                future.result()
+
+    def close(self):
+        """
+        Log the stats of whatever finished starting, save the SQL cache and
+        close the pool. Phases still running are abandoned with their daemon threads.
+        """
+        if self.database.done() and self.database.exception() is None:
+            logger.info(f"Database pool stats: {self.pool().stats()}")
+        if self.model.done() and self.model.exception() is None:
+            query_analyzer = self.query_analyzer()
+            logger.info(f"SQL cache stats: {query_analyzer.cache.stats()}")
+            logger.info(f"SQL generation latency by path: {query_analyzer.latency_report()}")
+            logger.info(f"Response cache stats: {self.response_cache().stats()}")
+            logger.info(f"Conversation memory stats: {self.memory().stats()}")
+            query_analyzer.cache.save()
+        if self.vectorstore.done() and self.vectorstore.exception() is None:
+            from embedding_service import get_embedding_service
+            logger.info(f"Embedding service stats: {get_embedding_service().stats()}")
+        logger.info(f"Startup timings:\n{self.report.report()}")
+        if self.database.done() and self.database.exception() is None:
+            self.pool().close()
+        if self.model.done() and self.model.exception() is None:
+            self.memory().close()
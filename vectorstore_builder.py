@@ -1,12 +1,16 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import InMemoryVectorStore
-from config import EMBEDDING_MODEL_NAME
-from config import CHROMA_PERSIST_DIR
-import torch
+from config import CHROMA_PERSIST_DIR, VECTORSTORE_MANIFEST, EMBEDDING_BATCH_SIZE
+from config import VECTORSTORE_BACKEND, VECTORSTORE_DIRS, NUMPY_STORE_DIR
+from numpy_store import NumpyVectorStore
+from embedding_service import get_embedding_service
 from langchain_chroma import Chroma
 from tqdm import tqdm
+import hashlib
+import json
 import logging
+import os
+from time import time
 
 logging.basicConfig(level=logging.INFO, 
                     format="%(asctime)s - %(levelname)s - %(message)s"
@@ -14,47 +18,216 @@ logging.basicConfig(level=logging.INFO,
 
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 500
 
-def build_vectorstore(docs):
+# chroma rejects deletes larger than its max batch size (~5k on sqlite)
+WRITE_BATCH_SIZE = 1000
+
+
+def document_hash(doc):
+    """
+    Stable hash of a document's content and metadata, used as its id in the store.
+    """
+    payload = json.dumps(
+        {"content": doc.page_content, "metadata": doc.metadata},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_manifest(path=VECTORSTORE_MANIFEST):
+    """
+    Load the build manifest, a mapping of document hash -> chunk ids in the store.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+        return {}
+
+
+def save_manifest(manifest, path=VECTORSTORE_MANIFEST):
+    # write to a temp file first so a crash never leaves a half written manifest
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+class _BatchWriter:
+    """
+    Buffers chunks, embeds them once per batch and upserts the vectors straight
+    into the collection, so only one batch of embeddings is ever held in memory.
+    """
+
+    def __init__(self, vectordb, embedding_model, batch_size):
+        self.collection = vectordb._collection
+        self.embedding_model = embedding_model
+        self.batch_size = batch_size
+        self.ids, self.texts, self.metadatas = [], [], []
+        self.written = 0
+        self.embed_seconds = 0.0
+        self.write_seconds = 0.0
+        self.progress = None
+
+    def add(self, chunk_id, text, metadata):
+        self.ids.append(chunk_id)
+        self.texts.append(text)
+        self.metadatas.append(metadata)
+        if len(self.ids) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.ids:
+            return
+        if self.progress is None:
+            self.progress = tqdm(desc="Computing embeddings", unit="chunk")
+
+        t0 = time()
+        embeddings = self.embedding_model.embed_documents(self.texts)
+        t1 = time()
+        self.collection.upsert(
+            ids=self.ids,
+            embeddings=embeddings,
+            metadatas=self.metadatas,
+            documents=self.texts
+        )
+        t2 = time()
+
+        batch = len(self.ids)
+        self.written += batch
+        self.embed_seconds += t1 - t0
+        self.write_seconds += t2 - t1
+        rate = batch / max(t2 - t0, 1e-9)
+        self.progress.update(batch)
+        self.progress.set_postfix(chunks_per_sec=f"{rate:.0f}")
+        logger.debug(f"Batch of {batch} chunks: embed {t1 - t0:.3f}s, write {t2 - t1:.3f}s ({rate:.0f} chunks/s)")
+        self.ids, self.texts, self.metadatas = [], [], []
+
+    def log_summary(self):
+        if self.progress is not None:
+            self.progress.close()
+        if not self.written:
+            return
+        total = self.embed_seconds + self.write_seconds
+        logger.info(
+            f"Embedded {self.written} chunks in {total:.1f}s "
+            f"(embed {self.embed_seconds:.1f}s, write {self.write_seconds:.1f}s, "
+            f"{self.written / max(total, 1e-9):.0f} chunks/s)"
+        )
+
+
+def open_vectorstore(backend=VECTORSTORE_BACKEND, embedding_model=None):
+    """
+    Open the persisted vector store of `backend` ("chroma" or "numpy"), empty if
+    it was never built. Query embeddings go through the process-wide
+    embedding service unless another `embedding_model` is given.
+    """
+    if embedding_model is None:
+        embedding_model = get_embedding_service()
+
+    if backend == "numpy":
+        return NumpyVectorStore(embedding_function=embedding_model, persist_directory=NUMPY_STORE_DIR)
+    if backend != "chroma":
+        raise ValueError(f"Unknown vector store backend: {backend}")
+    return Chroma(
+        persist_directory=CHROMA_PERSIST_DIR,
+        embedding_function=embedding_model
+    )
+
+
+def build_vectorstore(docs, backend=VECTORSTORE_BACKEND):
+    """
+    Sync the persisted vector store of `backend` with `docs`.
+
+    Only documents whose content hash is missing from the build manifest are split
+    and embedded (once, in batches of `EMBEDDING_BATCH_SIZE` written directly to the
+    collection), chunks of documents that disappeared are deleted and everything
+    else is reused from the backend's directory, so a restart with unchanged data
+    does no embedding at all.
+    """
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=2000,  
-        chunk_overlap=500,  
+        chunk_size=CHUNK_SIZE,  
+        chunk_overlap=CHUNK_OVERLAP,  
         separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],  
         keep_separator=True
     )
-    
-    split_docs = []
-    for doc in docs:
-        splits = text_splitter.split_text(doc.page_content)
-        for split in splits:
-            # Create new document with same metadata
-            new_doc = doc.copy()
-            new_doc.page_content = split
-            split_docs.append(new_doc)
 
+    vectordb = open_vectorstore(backend)
+    embedding_model = vectordb.embeddings
+    # each backend keeps its own manifest, so switching backends never confuses them
+    manifest_path = os.path.join(VECTORSTORE_DIRS[backend], "manifest.json")
 
-    logger.info(f"Created {len(split_docs)} chunks from {len(docs)} documents")
+    old_manifest = load_manifest(manifest_path)
+    stored = vectordb._collection.count()
+    if old_manifest and stored == 0:
+        # the collection was wiped but the manifest survived, rebuild everything
+        logger.info("Manifest found but vector store is empty, rebuilding from scratch")
+        old_manifest = {}
+    elif not old_manifest and stored:
+        # chunks the manifest doesn't know (e.g. a store built before manifests,
+        # with random ids) would never be replaced or deleted, start over
+        logger.info(f"Vector store has {stored} chunks but no manifest, resetting it before rebuilding")
+        vectordb.reset_collection()
 
-    logger.info("Initializing embedding model...")
-    embedding_model = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL_NAME,
-        model_kwargs={"device": "cuda" if torch.cuda.is_available() else "cpu"}
-    )
+    new_manifest = {}
+    writer = _BatchWriter(vectordb, embedding_model, EMBEDDING_BATCH_SIZE)
+    total_docs = 0
+    reused = 0
+    split_count = 0
+    for doc in docs:
+        total_docs += 1
+        doc_id = document_hash(doc)
+        if doc_id in new_manifest:
+            # identical row seen twice, one copy in the store is enough
+            continue
+        if doc_id in old_manifest:
+            new_manifest[doc_id] = old_manifest[doc_id]
+            reused += 1
+            continue
 
-    logger.info("Creating vector store...")
-    batch_size = 32  
-    all_embeddings = []
-    
-    for i in tqdm(range(0, len(split_docs), batch_size), desc="Computing embeddings"):
-        batch = split_docs[i:i + batch_size]
-        batch_embeddings = embedding_model.embed_documents([doc.page_content for doc in batch])
-        all_embeddings.extend(batch_embeddings)
-    
-    logger.info("Building Vector DB")
-    vectordb = Chroma.from_documents(
-        documents=split_docs,
-        embedding=embedding_model,
-        persist_directory=CHROMA_PERSIST_DIR
+        if len(doc.page_content) <= CHUNK_SIZE:
+            # fits in one chunk, the splitter would only strip it
+            text = doc.page_content.strip()
+            splits = [text] if text else []
+        else:
+            splits = text_splitter.split_text(doc.page_content)
+            split_count += 1
+        chunk_ids = [f"{doc_id}-{i}" for i in range(len(splits))]
+        for chunk_id, split in zip(chunk_ids, splits):
+            writer.add(chunk_id, split, doc.metadata)
+        new_manifest[doc_id] = chunk_ids
+    writer.flush()
+
+    stale_ids = [
+        chunk_id
+        for doc_id, chunk_ids in old_manifest.items() if doc_id not in new_manifest
+        for chunk_id in chunk_ids
+    ]
+    logger.info(
+        f"{total_docs} documents: {reused} unchanged, {len(new_manifest) - reused} new or changed, "
+        f"{len(old_manifest) - reused} removed, {split_count} split into chunks, "
+        f"{writer.written} chunks embedded"
     )
-    logger.info(f"Vector store created with {len(split_docs)} documents")
+    writer.log_summary()
+
+    if stale_ids:
+        logger.info(f"Deleting {len(stale_ids)} stale chunks...")
+        for i in range(0, len(stale_ids), WRITE_BATCH_SIZE):
+            vectordb.delete(ids=stale_ids[i:i + WRITE_BATCH_SIZE])
+
+    if backend == "numpy":
+        # the numpy store buffers writes, rewrite its files once at the end
+        vectordb.persist()
+
+    if new_manifest != old_manifest:
+        save_manifest(new_manifest, manifest_path)
+
+    logger.info(f"Vector store ready with {vectordb._collection.count()} chunks")
     return vectordb